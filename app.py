@@ -1,17 +1,37 @@
+import mimetypes
 import os
-import requests
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from functools import partial, wraps
 
-from auth import API_KEY
-from flask import Flask, render_template, request, flash, redirect, session, g, jsonify
+import click
+from flask import Flask, render_template, request, flash, redirect, session, g, jsonify, send_from_directory
+from flask.ctx import _AppCtxGlobals
 from flask_debugtoolbar import DebugToolbarExtension
 from sqlalchemy.exc import IntegrityError
-from random import randrange
-
+from random import Random, getrandbits
+
+from assets import AssetManifest
+from breed_filter import FILTER_TRAITS, TraitBitmaps
+from breed_search import BreedSearch
+from cat_api import BASE_URL, CatAPIClient, CatAPIError
+from catalog import BreedCatalog
+from compression import best_encoding, compress_response
+from fragments import RenderedFragments
 from forms import UserAddForm, LoginForm, EditUserForm
-from models import db, connect_db, User, Favorite
+from hashing import HasherBusy
+from http_cache import files_digest, make_etag, public_when_unchanged
+from identity import UserCache
+from image_cache import ImageCache, ImagePrefetcher
+import metrics
+from models import db, connect_db, User, Favorite, FavoriteCount, Recommendation, REPLICA
+from query_guard import watch_for_repeated_queries
+from recommendations import TasteModel, recompute_all, recompute_for
+from similarity import METRICS, SimilarBreeds
 
 CURR_USER_KEY = "curr_user"
-BASE_URL = "https://api.thecatapi.com/v1"
+PRIMARY_UNTIL_KEY = "primary_until"
+ONE_YEAR = 365 * 24 * 60 * 60
 
 
 app = Flask(__name__)
@@ -23,26 +43,208 @@ if uri and uri.startswith("postgres://"):
 
 app.config['SQLALCHEMY_DATABASE_URI'] = uri
 
+replica_uri = os.environ.get('DATABASE_REPLICA_URL')
+if replica_uri and replica_uri.startswith("postgres://"):
+    replica_uri = replica_uri.replace("postgres://", "postgresql://", 1)
+
+app.config['SQLALCHEMY_BINDS'] = {REPLICA: replica_uri} if replica_uri else None
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+    'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+    'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+    'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+    'pool_pre_ping': True,
+}
+# How long after writing a user's reads stay on the primary, to cover replication lag.
+app.config['REPLICA_STICKY_SECONDS'] = int(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SQLALCHEMY_ECHO'] = False
 app.config['DEBUG_TB_INTERCEPT_REDIRECTS'] = False
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', "it's a secret")
+app.config['BCRYPT_LOG_ROUNDS'] = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE', 16))
+app.config['USER_CACHE_TTL'] = int(os.environ.get('USER_CACHE_TTL', 30))
+app.config['LEADERBOARD_TTL'] = int(os.environ.get('LEADERBOARD_TTL', 60))
+app.config['LEADERBOARD_SIZE'] = 50
+app.config['FAVORITES_BATCH_LIMIT'] = 500
+app.config['FAVORITES_PER_PAGE'] = int(os.environ.get('FAVORITES_PER_PAGE', 24))
+app.config['BREED_CACHE_TTL'] = int(os.environ.get('BREED_CACHE_TTL', 3600))
+app.config['BREED_REFRESH_INTERVAL'] = int(os.environ.get('BREED_REFRESH_INTERVAL', 900))
+app.config['BREED_SNAPSHOT_PATH'] = os.environ.get('BREED_SNAPSHOT_PATH',
+                                                   os.path.join(app.instance_path, 'breeds.json'))
+app.config['BREEDS_PER_PAGE'] = int(os.environ.get('BREEDS_PER_PAGE', 24))
+app.config['SIMILAR_BREEDS'] = int(os.environ.get('SIMILAR_BREEDS', 6))
+app.config['RECOMMENDATIONS'] = int(os.environ.get('RECOMMENDATIONS', 6))
+app.config['UPSTREAM_WORKERS'] = int(os.environ.get('UPSTREAM_WORKERS', 8))
+app.config['IMAGE_SEARCH_DEADLINE'] = float(os.environ.get('IMAGE_SEARCH_DEADLINE', 2))
+app.config['IMAGE_CACHE_TTL'] = int(os.environ.get('IMAGE_CACHE_TTL', 3600))
+app.config['IMAGE_CACHE_MAX_ENTRIES'] = int(os.environ.get('IMAGE_CACHE_MAX_ENTRIES', 256))
+app.config['IMAGE_CACHE_MAX_BYTES'] = int(os.environ.get('IMAGE_CACHE_MAX_BYTES', 1_000_000))
+app.config['IMAGE_PREFETCH_INTERVAL'] = int(os.environ.get('IMAGE_PREFETCH_INTERVAL', 300))
+app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 500))
+app.config['COMPRESS_LEVEL'] = int(os.environ.get('COMPRESS_LEVEL', 6))
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+
+
+# Registered first, so that they time everything the other hooks do too.
+@app.before_request
+def start_request_metrics():
+    metrics.start_request()
+
+
+@app.after_request
+def record_request_metrics(response):
+    metrics.finish_request(request.endpoint, request.method, response.status_code)
+    return response
+
+
+# Registered before the debug toolbar so that it compresses the page after
+# the toolbar has been added to it.
+@app.after_request
+def compress(response):
+    return compress_response(response, app.config['COMPRESS_MIN_SIZE'], app.config['COMPRESS_LEVEL'])
+
+
 toolbar = DebugToolbarExtension(app)
+watch_for_repeated_queries(app)
+
+assets = AssetManifest(app.static_folder)
+app.jinja_env.globals['asset_url'] = assets.url
+
+# Changes whenever a template or static asset does, so that cached pages are re-rendered.
+TEMPLATE_VERSION = make_etag(files_digest(os.path.join(app.root_path, app.template_folder)), assets.version)
 
 connect_db(app)
 
+cat_api = CatAPIClient(base_url=os.environ.get('CAT_API_BASE_URL', BASE_URL),
+                       observe=metrics.observe_upstream)
+breed_catalog = BreedCatalog(cat_api.get_breeds,
+                             ttl=app.config['BREED_CACHE_TTL'],
+                             snapshot_path=app.config['BREED_SNAPSHOT_PATH'] or None,
+                             refresh_interval=app.config['BREED_REFRESH_INTERVAL'])
+# Loaded here rather than on the first request so that, with gunicorn's
+# --preload, every worker is forked with the catalog already in memory.
+breed_catalog.load_snapshot()
+# Built with breed_catalog.derive(), so once per catalog version.
+similar_breeds = partial(SimilarBreeds, k=app.config['SIMILAR_BREEDS'])
+upstream_pool = ThreadPoolExecutor(max_workers=app.config['UPSTREAM_WORKERS'],
+                                   thread_name_prefix='upstream')
+image_cache = ImageCache(cat_api.search_images,
+                         ttl=app.config['IMAGE_CACHE_TTL'],
+                         max_entries=app.config['IMAGE_CACHE_MAX_ENTRIES'],
+                         max_bytes=app.config['IMAGE_CACHE_MAX_BYTES'])
+
+
+def most_favorited_breed_ids(n):
+    """Ids of the `n` breeds that appear most often in users' favorites.
+
+    Used by the image prefetcher, outside of any request.
+    """
+
+    with app.app_context():
+        loved = most_loved_breeds()[:n]
+
+    by_name = breed_catalog.get_index().by_name
+    return [by_name[name]['id'] for (name, _) in loved if name in by_name]
+
+
+_leaderboard = (0.0, [])
+
+
+def most_loved_breeds():
+    """The most favorited breeds as (breed_name, count), cached for LEADERBOARD_TTL seconds."""
+
+    global _leaderboard
+
+    expires, rows = _leaderboard
+    if time.monotonic() > expires:
+        rows = [tuple(row) for row in FavoriteCount.top(app.config['LEADERBOARD_SIZE'])]
+        _leaderboard = (time.monotonic() + app.config['LEADERBOARD_TTL'], rows)
+
+    return rows
+
+
+image_prefetcher = ImagePrefetcher(image_cache, most_favorited_breed_ids,
+                                   interval=app.config['IMAGE_PREFETCH_INTERVAL'])
+user_cache = UserCache(ttl=app.config['USER_CACHE_TTL'])
+
 ##############################################################################
-# User signup/login/logout
+# Background jobs
 
 @app.before_request
-def add_user_to_g():
-    """If we're logged in, add curr user to Flask global."""
+def start_background_jobs():
+    """Make sure this worker's background threads are running."""
+
+    breed_catalog.ensure_refresher()
+    image_prefetcher.ensure_started()
+
+
+##############################################################################
+# Metrics
+
+@app.route('/metrics')
+def show_metrics():
+    """Metrics for Prometheus to scrape, summed over every worker."""
+
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f"Bearer {token}":
+        return ("", 401)
+
+    body, content_type = metrics.render()
+    return (body, 200, {'Content-Type': content_type})
+
+
+##############################################################################
+# Read replica
+#
+# Reads inside db.replica() blocks go to DATABASE_REPLICA_URL, if it's set.
+# After a request writes, that visitor's reads stay on the primary for
+# REPLICA_STICKY_SECONDS so that a lagging replica can't hide their changes.
+
+@app.before_request
+def stick_to_primary_after_writes():
+    if app.config['SQLALCHEMY_BINDS'] and session.get(PRIMARY_UNTIL_KEY, 0) > time.time():
+        db.session.info['stick_to_primary'] = True
+
+
+@app.after_request
+def remember_writes(response):
+    if app.config['SQLALCHEMY_BINDS'] and db.session.info.get('wrote'):
+        session[PRIMARY_UNTIL_KEY] = time.time() + app.config['REPLICA_STICKY_SECONDS']
+
+    return response
+
+
+##############################################################################
+# User signup/login/logout
+
+def load_current_user():
+    """The logged in user, or None."""
 
     if CURR_USER_KEY in session:
-        g.user = User.query.get(session[CURR_USER_KEY])
+        with db.replica():
+            return user_cache.load(session[CURR_USER_KEY])
 
-    else:
-        g.user = None
+    return None
+
+
+class AppGlobals(_AppCtxGlobals):
+    """Flask's `g`, except that `g.user` is only loaded the first time it's used.
+
+    Requests that never look at the user don't query the database for it.
+    """
+
+    def __getattr__(self, name):
+        if name == 'user':
+            self.user = load_current_user()
+            return self.user
+
+        return super().__getattr__(name)
+
+
+app.app_ctx_globals_class = AppGlobals
 
 
 def do_login(user):
@@ -97,6 +299,9 @@ def login():
                                  form.password.data)
 
         if user:
+            # Saves the password if authenticate() rehashed it.
+            db.session.commit()
+            user_cache.invalidate(user.id)
             do_login(user)
             flash(f"Hello, {user.username}!", "success")
             return redirect("/")
@@ -115,15 +320,110 @@ def logout():
     return redirect('/login')
 
 
+##############################################################################
+# HTTP caching
+#
+# Pages that only depend on the breed catalog are the same for every anonymous
+# visitor. They get a strong ETag made from the catalog and template versions
+# and a repeat visit is answered with 304 Not Modified without rendering.
+# Everything else is private and not stored.
+
+def is_personalized():
+    """Whether this request's page depends on who is asking."""
+
+    return CURR_USER_KEY in session or '_flashes' in session
+
+
+def catalog_etag(*parts):
+    """ETag for a page built from the current catalog plus `parts`."""
+
+    return make_etag(breed_catalog.get_index().digest, TEMPLATE_VERSION, *parts)
+
+
+def breed_page_etag(breed_id):
+    """ETag for a breed page, which also shows that breed's cached images.
+
+    The images are refetched (and come back different) once they expire, so
+    their digest is part of the tag. Until they're cached there's no tag.
+    """
+
+    if breed_id not in breed_catalog.get_index().by_id:
+        return None
+
+    images = image_cache.digest(breed_id, 5)
+    if images is None:
+        return None
+    return catalog_etag('cat_info', breed_id, images)
+
+
+def counts_breed_view(view):
+    """Count a view of the breed for the image prefetcher, including views answered with a 304."""
+
+    @wraps(view)
+    def wrapper(breed_id):
+        if breed_id in breed_catalog.get_index().by_id:
+            image_cache.record_view(breed_id)
+        return view(breed_id)
+
+    return wrapper
+
+
+@app.after_request
+def add_cache_headers(response):
+    """Keep anything without its own caching policy out of shared caches."""
+
+    if request.endpoint not in ('static', 'static_asset') and 'Cache-Control' not in response.headers:
+        response.headers['Cache-Control'] = 'private, no-store'
+
+    return response
+
+
+@app.route('/static/dist/<path:filename>')
+def static_asset(filename):
+    """Serve a fingerprinted asset, precompressed, to be cached for a year."""
+
+    if not assets.is_fingerprinted(f"dist/{filename}"):
+        return ("", 404)
+
+    mimetype = mimetypes.guess_type(filename)[0]
+    encoding = best_encoding()
+    folder = os.path.join(app.static_folder, 'dist')
+    suffix = {'gzip': '.gz', 'br': '.br'}.get(encoding)
+
+    if suffix and os.path.exists(os.path.join(folder, filename + suffix)):
+        response = send_from_directory(folder, filename + suffix, mimetype=mimetype, max_age=ONE_YEAR)
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = send_from_directory(folder, filename, mimetype=mimetype, max_age=ONE_YEAR)
+
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def render_fragment(key, template, **context):
+    """Render `template` once per catalog version and reuse the HTML after that.
+
+    Only for markup that depends on nothing but the catalog; anything about
+    the current user is rendered around it on each request.
+    """
+
+    fragments = breed_catalog.derive(RenderedFragments)
+    return fragments.get(key, lambda: render_template(template, **context))
+
+
 ##############################################################################
 # Homepage and error page
 
 @app.route('/')
+@public_when_unchanged(lambda: catalog_etag('index'), is_personalized)
 def index():
     """Show home page of all cat breeds, allow user to search specific breed, allow user to filter by breed characteristics."""
-    res = requests.get(f'{BASE_URL}/breeds', headers=API_KEY)
-    data = res.json()
-    return render_template('index.html', breeds=data)
+    per_page = app.config['BREEDS_PER_PAGE']
+    breeds, total = breed_catalog.derive(TraitBitmaps).page({}, 1, per_page)
+    grid = render_fragment(('grid', per_page), '_breed_grid.html', breeds=breeds)
+    return render_template('index.html', grid=grid, breeds=breeds, total=total)
 
 
 @app.route('/oops')
@@ -133,98 +433,386 @@ def oops():
     return render_template('sorry.html')
 
 
+@app.errorhandler(HasherBusy)
+def hasher_busy(e):
+    """Too many logins and signups are being processed right now."""
+
+    db.session.rollback()
+    flash("We're very busy right now, please try again in a moment.", "danger")
+    return redirect(request.path)
+
+
+@app.errorhandler(CatAPIError)
+def cat_api_unavailable(e):
+    """The Cat API is down and there's nothing cached to show instead."""
+
+    app.logger.warning("The Cat API is unavailable: %s", e)
+    return redirect('/oops')
+
+
 ##############################################################################
 # Cat breed routes
 
 @app.route('/cats/<breed_id>')
+@counts_breed_view
+@public_when_unchanged(breed_page_etag, is_personalized)
 def breed_info(breed_id):
     """Show information of a specific breed.
     
     Redirect to an error page if it is not a valid breed.
     """
-    res = requests.get(f'{BASE_URL}/breeds', headers=API_KEY)
-    data = res.json()
-    # The API has a get request for finding a breed by its name, but often times, it returns empty JSON, so I had to do this roundabout way of requesting all the breeds > finding the index of the dict matching the cat breed's id > pulling that dict out of the full list
+    img_future = None
+    if not breed_catalog.is_loaded:
+        # Nothing is cached yet, so overlap the image search with fetching the catalog.
+        img_future = upstream_pool.submit(image_cache.load, breed_id, 5)
+
+    breed = breed_catalog.get_index().by_id.get(breed_id)
 
-    if not any(d['id'] == breed_id for d in data):
+    if breed is None:
         return redirect('/oops')
 
-    breed_idx = [i for i, d in enumerate(data) if breed_id in d.values()][0]
-    breed = data[breed_idx]
+    return render_breed_page(breed, img_future)
 
-    img_res = requests.get(f'{BASE_URL}/images/search', params={"breed_ids":breed_id, "limit":5}, headers=API_KEY)
-    img_data = img_res.json()
+
+def render_breed_page(breed, img_future=None):
+    """Render the information page for `breed`.
+
+    Waits up to IMAGE_SEARCH_DEADLINE for its images, on `img_future` if a
+    search is already under way.
+    """
+
+    breed_id = breed['id']
+
+    img_data = image_cache.lookup(breed_id, 5) if img_future is None else None
+
+    if img_data is None:
+        if img_future is None:
+            img_future = upstream_pool.submit(image_cache.load, breed_id, 5)
+        try:
+            img_data = img_future.result(timeout=app.config['IMAGE_SEARCH_DEADLINE'])
+        except (TimeoutError, CatAPIError):
+            img_data = []
+            g.skip_http_cache = True
 
     if g.user:
-        favs = (fav.breed_name for fav in g.user.favorites)
+        with db.replica():
+            favs = [fav.breed_name for fav in g.user.favorites]
     else:
         favs = ()
 
-    return render_template('cat_info.html', breed=breed, imgs=img_data, favs=favs, user=g.user)
+    details = render_fragment(('details', breed_id), '_breed_details.html', breed=breed,
+                              similar=breed_catalog.derive(similar_breeds).similar_to(breed_id))
+    return render_template('cat_info.html', breed=breed, details=details, imgs=img_data, favs=favs, user=g.user)
+
+
+def update_recommendations(user_id):
+    """Recompute one user's recommendations after their favorites change."""
+
+    recompute_for(breed_catalog.derive(TasteModel), [user_id], app.config['RECOMMENDATIONS'])
 
 
 @app.route('/api/togglefav', methods=["POST"])
 def toggle_fav():
     """Add breed to favorites. If the breed is already in favorites, remove it."""
 
+    if not g.user:
+        return (jsonify(message="Log in to favorite breeds"), 401)
+
     breed_name = request.json["breed_name"]
+    user_id = g.user.id
 
-    if g.user:
-        favs = (fav.breed_name for fav in g.user.favorites)
-        if breed_name in favs:
-            fav = Favorite.query.get_or_404((g.user.id, f'{breed_name}'))
-            db.session.delete(fav)
-            db.session.commit()
+    favorited = Favorite.toggle(user_id, breed_name)
+    update_recommendations(user_id)
+    db.session.commit()
 
-            return jsonify(message=f"deleted ({g.user.id}, {breed_name}) from favorites")
-        else:
-            new_fav = Favorite(user_id=g.user.id, breed_name=breed_name)
-            db.session.add(new_fav)
-            db.session.commit()
-            response_json = jsonify(fav=new_fav.serialize())
+    if not favorited:
+        return jsonify(message=f"deleted ({user_id}, {breed_name}) from favorites")
+
+    new_fav = Favorite(user_id=user_id, breed_name=breed_name)
+    return (jsonify(fav=new_fav.serialize()), 201)
+
+
+@app.route('/api/favorites/batch', methods=["POST"])
+def batch_favorites():
+    """Apply a list of favorite changes in one transaction.
+
+    Expects {"ops": [{"op": "add" or "remove", "breed_name": ...}, ...]}.
+    Only the last op for each breed counts.
+    """
+
+    if not g.user:
+        return (jsonify(message="Log in to favorite breeds"), 401)
+
+    body = request.json
+    ops = body.get("ops") if isinstance(body, dict) else None
+    if not isinstance(ops, list) or len(ops) > app.config['FAVORITES_BATCH_LIMIT']:
+        return (jsonify(message=f"ops must be a list of at most {app.config['FAVORITES_BATCH_LIMIT']} changes"), 400)
+
+    wanted = {}
+    for op in ops:
+        if (not isinstance(op, dict) or op.get("op") not in ("add", "remove")
+                or not isinstance(op.get("breed_name"), str)):
+            return (jsonify(message="Each op needs an op of add or remove and a breed_name"), 400)
+        wanted[op["breed_name"]] = op["op"]
+
+    user_id = g.user.id
+    removed = Favorite.remove_many(user_id, [name for name, op in wanted.items() if op == "remove"])
+    added = Favorite.add_many(user_id, [name for name, op in wanted.items() if op == "add"])
+    if added or removed:
+        update_recommendations(user_id)
+    db.session.commit()
+
+    return jsonify(added=added, removed=removed)
+
+
+##############################################################################
+# Breed API
+
+def serialize_breed_card(breed):
+    """The fields the index page needs to draw a breed's card."""
+
+    card = {
+        'id': breed['id'],
+        'name': breed['name'],
+        'image_url': (breed.get('image') or {}).get('url'),
+    }
+    card.update({trait: breed.get(trait) for trait in FILTER_TRAITS})
+    return card
+
+
+@app.route('/api/breeds')
+@public_when_unchanged(lambda: catalog_etag('list_breeds', request.query_string), lambda: False)
+def list_breeds():
+    """Return one page of breeds, filtered by trait levels.
+
+    e.g. /api/breeds?energy_level=4&hypoallergenic=1&page=2
+    """
+
+    levels = {}
+    for trait in FILTER_TRAITS:
+        value = request.args.get(trait, '')
+        if value:
+            if not value.isdigit():
+                return (jsonify(message=f"{trait} must be a number"), 400)
+            levels[trait] = int(value)
+
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', app.config['BREEDS_PER_PAGE'], type=int), 1), 100)
+
+    breeds, total = breed_catalog.derive(TraitBitmaps).page(levels, page, per_page)
+
+    return jsonify(breeds=[serialize_breed_card(breed) for breed in breeds],
+                   total=total,
+                   page=page,
+                   per_page=per_page,
+                   pages=-(-total // per_page))
+
+
+@app.route('/api/breeds/search')
+@public_when_unchanged(lambda: catalog_etag('search_breeds', request.query_string), lambda: False)
+def search_breeds():
+    """Return breeds whose name, alternate names or origin match a typed query, best first.
+
+    e.g. /api/breeds/search?q=brit&limit=5
+    """
+
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 25)
+    results = breed_catalog.derive(BreedSearch).search(request.args.get('q', ''), limit)
+
+    return jsonify(results=[dict(serialize_breed_card(breed), match=match) for breed, match in results])
+
+
+@app.route('/api/breeds/<breed_id>/similar')
+@public_when_unchanged(lambda breed_id: catalog_etag('similar_breeds', breed_id, request.query_string),
+                       lambda: False)
+def similar_to_breed(breed_id):
+    """Return the breeds whose traits are most like this one's, most similar first.
+
+    e.g. /api/breeds/abys/similar?metric=euclidean&limit=3
+    """
+
+    if breed_id not in breed_catalog.get_index().by_id:
+        return (jsonify(message="No such breed"), 404)
+
+    metric = request.args.get('metric', 'cosine')
+    if metric not in METRICS:
+        return (jsonify(message=f"metric must be one of {', '.join(METRICS)}"), 400)
+
+    k = app.config['SIMILAR_BREEDS']
+    limit = min(max(request.args.get('limit', k, type=int), 1), k)
+    similar = breed_catalog.derive(similar_breeds).similar_to(breed_id, metric, limit)
+
+    return jsonify(breeds=[dict(serialize_breed_card(breed), similarity=score) for breed, score in similar])
+
+
+@app.route('/api/breeds/popular')
+def popular_breeds():
+    """Return the most favorited breeds, most loved first."""
+
+    limit = min(max(request.args.get('limit', 10, type=int), 1), app.config['LEADERBOARD_SIZE'])
+    by_name = breed_catalog.get_index().by_name
 
-            return (response_json, 201)
+    breeds = []
+    for name, count in most_loved_breeds():
+        breed = by_name.get(name)
+        if breed:
+            breeds.append({**serialize_breed_card(breed), 'favorites': count})
+        if len(breeds) == limit:
+            break
 
+    return jsonify(breeds=breeds)
+
+
+@app.route('/api/breeds/<breed_id>/popularity')
+def breed_popularity(breed_id):
+    """Return how many users have favorited a breed."""
+
+    breed = breed_catalog.get_index().by_id.get(breed_id)
+    if breed is None:
+        return (jsonify(message="No such breed"), 404)
+
+    return jsonify(breed_name=breed['name'], favorites=FavoriteCount.count_for(breed['name']))
+
+
+@app.cli.command('reconcile-favorite-counts')
+def reconcile_favorite_counts():
+    """Recompute favorite counts from the favorites table and report any drift."""
+
+    drift = FavoriteCount.reconcile()
+    db.session.commit()
+
+    for name, (stored, actual) in sorted(drift.items()):
+        print(f"{name}: {stored} -> {actual}")
+    print(f"{len(drift)} breed count(s) corrected.")
+
+
+@app.cli.command('recompute-recommendations')
+@click.option('--chunk-size', default=500, show_default=True, help="Users to recompute per transaction.")
+def recompute_recommendations(chunk_size):
+    """Recompute every user's breed recommendations from their favorites."""
+
+    total = recompute_all(breed_catalog.derive(TasteModel), chunk_size, app.config['RECOMMENDATIONS'])
+    print(f"Recomputed recommendations for {total} user(s).")
 
 
 ##############################################################################
 # Random Cat routes
 
+RANDOM_CAT_KEY = 'random_cat'
+
+
+def shuffled(seed, size):
+    """Positions 0..size-1 in the order given by `seed`."""
+
+    order = list(range(size))
+    Random(seed).shuffle(order)
+    return order
+
+
+def next_random_positions(size):
+    """Positions in the catalog of the breed to show now and the one to show after it.
+
+    Each visitor's session holds a shuffle seed and how far through that
+    shuffle they are, so they see every breed once before any repeats. A new
+    shuffle never starts with the breed that ended the last one.
+    """
+
+    seed, cursor, seen_size = session.get(RANDOM_CAT_KEY) or (None, 0, size)
+    if seed is None or seen_size != size:
+        seed, cursor = getrandbits(32), 0
+
+    order = shuffled(seed, size)
+    position = order[cursor]
+    cursor += 1
+
+    if cursor == size:
+        seed, cursor = getrandbits(32), 0
+        while size > 1 and shuffled(seed, size)[0] == position:
+            seed = getrandbits(32)
+        order = shuffled(seed, size)
+
+    session[RANDOM_CAT_KEY] = [seed, cursor, size]
+    return position, order[cursor]
+
+
+def prefetch_images(breed_id):
+    """Start fetching a breed's images in the background unless they're already cached."""
+
+    if not image_cache.is_fresh(breed_id, 5):
+        upstream_pool.submit(image_cache.load, breed_id, 5)
+
+
 @app.route('/random')
 def show_random_cat():
-    """Redirect to a random cat."""
+    """Show a random cat, without repeats until every breed has been shown.
 
-    res = requests.get(f'{BASE_URL}/breeds', headers=API_KEY)
-    data = res.json()
+    The page is rendered here rather than redirected to, and the images for
+    the breed that will come up next are fetched in the background.
+    """
 
-    breed_idx = randrange(len(data))
-    breed_id = data[breed_idx]['id']
+    index = breed_catalog.get_index()
 
-    return redirect(f'/cats/{breed_id}')
+    if not index.ids:
+        return redirect('/oops')
+
+    position, following = next_random_positions(len(index.ids))
+    image_cache.record_view(index.ids[position])
+    prefetch_images(index.ids[following])
+
+    return render_breed_page(index.breeds[position])
 
 
 ##############################################################################
 # User routes
 
+def favorites_page(user_id, limit):
+    """The catalog entries for one page of a user's favorites, plus the cursor for the next page."""
+
+    names, next_after = Favorite.page_for(user_id, after=request.args.get('after') or None, limit=limit)
+
+    breeds_by_name = breed_catalog.get_index().by_name
+    breeds = [breeds_by_name[name] for name in names if name in breeds_by_name]
+
+    return breeds, next_after
+
+
 @app.route('/users/<int:user_id>')
 def show_user_profile(user_id):
-    """Show profile of a specific user and their favorited breeds."""
+    """Show profile of a specific user and a page of their favorited breeds."""
     if not g.user:
         flash("Access unauthorized.", "danger")
         return redirect("/")
 
-    user = User.query.get_or_404(user_id)
-    fav_breed_names = [fav.breed_name for fav in user.favorites]
-    fav_breeds_info = []
+    with db.replica():
+        user = User.query.get_or_404(user_id)
+        fav_breeds_info, next_after = favorites_page(user_id, app.config['FAVORITES_PER_PAGE'])
+        recommended_names = Recommendation.for_user(user_id, app.config['RECOMMENDATIONS'])
+
+    breeds_by_name = breed_catalog.get_index().by_name
+    recommended = [breeds_by_name[name] for name in recommended_names if name in breeds_by_name]
+
+    return render_template('user_profile.html', user=user, fav_breeds=fav_breeds_info, next_after=next_after,
+                           recommended=recommended)
 
-    res = requests.get(f'{BASE_URL}/breeds', headers=API_KEY)
-    data = res.json()
-    for breed_name in fav_breed_names:
-        breed_idx = [i for i, d in enumerate(data) if breed_name in d.values()][0]
-        breed_info = data[breed_idx]
-        fav_breeds_info.append(breed_info)
 
-    return render_template('user_profile.html', user=user, fav_breeds=fav_breeds_info)
+@app.route('/api/users/<int:user_id>/favorites')
+def list_user_favorites(user_id):
+    """A page of a user's favorited breeds as JSON.
+
+    Takes ?after=<next from the previous page> and ?limit= (at most 100).
+    """
+
+    if not g.user:
+        return (jsonify(message="Log in to see favorites"), 401)
+
+    limit = min(max(request.args.get('limit', app.config['FAVORITES_PER_PAGE'], type=int), 1), 100)
+
+    with db.replica():
+        if not db.session.query(User.query.filter_by(id=user_id).exists()).scalar():
+            return (jsonify(message="No such user"), 404)
+        breeds, next_after = favorites_page(user_id, limit)
+
+    return jsonify(favorites=[serialize_breed_card(breed) for breed in breeds], next=next_after)
 
 
 @app.route('/users/<int:user_id>/edit', methods=["GET", "POST"])
@@ -246,6 +834,7 @@ def edit_user_profile(user_id):
             g.user.image_url = form.image_url.data or User.image_url.default.arg,
 
             db.session.commit()
+            user_cache.invalidate(g.user.id)
 
             return redirect(f"/users/{g.user.id}")
         
@@ -263,27 +852,11 @@ def delete_user():
         flash("Access unauthorized.", "danger")
         return redirect("/")
 
+    user_id = g.user.id
     do_logout()
 
     db.session.delete(g.user)
     db.session.commit()
+    user_cache.invalidate(user_id)
 
     return redirect("/signup")
-
-
-##############################################################################
-# Turn off all caching in Flask
-#   (useful for dev; in production, this kind of stuff is typically
-#   handled elsewhere)
-#
-# https://stackoverflow.com/questions/34066804/disabling-caching-in-flask
-
-@app.after_request
-def add_header(req):
-    """Add non-caching headers on every request."""
-
-    req.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-    req.headers["Pragma"] = "no-cache"
-    req.headers["Expires"] = "0"
-    req.headers['Cache-Control'] = 'public, max-age=0'
-    return req
\ No newline at end of file
@@ -0,0 +1,95 @@
+"""Content-hashed copies of the static assets, built once at deploy time.
+
+Run `python assets.py` to copy app.css and app.js to static/dist/ under names
+that include a hash of their contents (app.3f2a9c1e.css), along with gzip and
+brotli versions and a manifest.json mapping each original name to its copy.
+As the URL changes whenever the file does, browsers may cache them forever.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import sys
+
+from flask import url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ASSETS = ('app.css', 'app.js')
+MANIFEST = 'manifest.json'
+
+
+def fingerprint(name, content):
+    """'app.js' -> 'app.<hash of content>.js'"""
+
+    root, ext = os.path.splitext(name)
+    return f"{root}.{hashlib.sha1(content).hexdigest()[:8]}{ext}"
+
+
+def build(static_folder, names=ASSETS, dist='dist'):
+    """Write fingerprinted and precompressed copies of `names` and return the manifest."""
+
+    out_folder = os.path.join(static_folder, dist)
+    os.makedirs(out_folder, exist_ok=True)
+    manifest = {}
+
+    for name in names:
+        with open(os.path.join(static_folder, name), 'rb') as f:
+            content = f.read()
+
+        hashed = fingerprint(name, content)
+        path = os.path.join(out_folder, hashed)
+
+        with open(path, 'wb') as f:
+            f.write(content)
+        with open(path + '.gz', 'wb') as f:
+            f.write(gzip.compress(content, 9, mtime=0))
+        if brotli is not None:
+            with open(path + '.br', 'wb') as f:
+                f.write(brotli.compress(content))
+
+        manifest[name] = f"{dist}/{hashed}"
+
+    with open(os.path.join(out_folder, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    return manifest
+
+
+class AssetManifest:
+    """Maps static file names to their fingerprinted copies, if they've been built.
+
+    Without a manifest (say, in development) files are served from /static as is.
+    """
+
+    def __init__(self, static_folder, dist='dist'):
+        self.static_folder = static_folder
+        self.files = {}
+        self.version = None
+
+        try:
+            with open(os.path.join(static_folder, dist, MANIFEST), 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            return
+
+        self.files = json.loads(content)
+        self.version = hashlib.sha1(content).hexdigest()[:16]
+
+    def is_fingerprinted(self, filename):
+        return filename in self.files.values()
+
+    def url(self, name):
+        """URL to use for the static file `name` in templates."""
+
+        return url_for('static', filename=self.files.get(name, name))
+
+
+if __name__ == '__main__':
+    folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    for name, hashed in build(folder).items():
+        print(f"{name} -> {hashed}")
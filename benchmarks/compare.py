@@ -0,0 +1,42 @@
+"""Compare two benchmark results from run.py, e.g. before and after a change.
+
+    python benchmarks/compare.py before.json after.json [--metric p95_ms]
+
+Prints each route's value in both runs and the percentage change.
+"""
+
+import argparse
+import json
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def rows(before, after, metric):
+    for name in sorted(set(before) | set(after)):
+        for mode in ('sequential', 'concurrent'):
+            old = before.get(name, {}).get(mode, {}).get(metric)
+            new = after.get(name, {}).get(mode, {}).get(metric)
+            if old is None and new is None:
+                continue
+            change = (new - old) / old * 100 if old and new is not None else None
+            yield name, mode, old, new, change
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--metric', default='p95_ms')
+    args = parser.parse_args(argv)
+
+    print(f"{'route':<32} {'mode':<11} {'before':>10} {'after':>10} {'change':>8}")
+    for name, mode, old, new, change in rows(load(args.before), load(args.after), args.metric):
+        change = '' if change is None else f"{change:+.1f}%"
+        print(f"{name:<32} {mode:<11} {str(old):>10} {str(new):>10} {change:>8}")
+
+
+if __name__ == '__main__':
+    main()
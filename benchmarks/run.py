@@ -0,0 +1,334 @@
+"""Route benchmarks against a local stand-in for The Cat API.
+
+Drives every route in app.py through Flask's test client, first one request
+at a time and then (for read-only routes) from several threads at once, and
+reports latency percentiles, throughput and database queries per request as
+JSON:
+
+    python benchmarks/run.py --latency 0.05 --output bench.json
+    python benchmarks/compare.py before.json bench.json
+
+Uses the database in BENCH_DATABASE_URL (default postgresql:///cat_finder_bench),
+which is dropped and recreated.
+"""
+
+import argparse
+import atexit
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'tests')]
+
+from stub_api import StubCatAPI  # noqa: E402
+
+PASSWORD = "BENCH_PASSWORD"
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+
+    if not sorted_values:
+        return None
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies, elapsed, queries, errors):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    ms = lambda seconds: None if seconds is None else round(seconds * 1000, 3)
+
+    return {
+        'requests': count,
+        'errors': errors,
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'mean_ms': ms(sum(latencies) / count) if count else None,
+        'throughput_rps': round(count / elapsed, 1) if elapsed else None,
+        'queries_per_request': round(queries / count, 2) if count else None,
+    }
+
+
+class QueryCounter:
+    """Counts statements sent to the database by any thread."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.count = 0
+        self._lock = threading.Lock()
+        event.listen(engine, 'before_cursor_execute', self._before_execute)
+
+    def _before_execute(self, *args):
+        with self._lock:
+            self.count += 1
+
+
+class Scenario:
+    """One route to benchmark.
+
+    `path`, `data` and `json` may be callables taking the iteration number. `prepare`
+    runs untimed before each request and may return a user id to log in as,
+    overriding `user`.
+    """
+
+    def __init__(self, name, path, method='GET', data=None, json=None, headers=None, user=False, prepare=None,
+                 concurrent=False):
+        self.name = name
+        self.path = path
+        self.method = method
+        self.data = data
+        self.json = json
+        self.headers = headers
+        self.user = user
+        self.prepare = prepare
+        self.concurrent = concurrent
+
+    def request(self, client, i):
+        path = self.path(i) if callable(self.path) else self.path
+        data = self.data(i) if callable(self.data) else self.data
+        payload = self.json(i) if callable(self.json) else self.json
+        return client.open(path, method=self.method, data=data, json=payload, headers=self.headers)
+
+
+class Bench:
+    def __init__(self, app_module, users, favorites):
+        self.app_module = app_module
+        self.app = app_module.app
+        self.queries = QueryCounter(self.engine())
+        self.user_ids = self.seed(users, favorites)
+        self.lock = threading.Lock()
+
+    def engine(self):
+        with self.app.app_context():
+            return self.app_module.db.engine
+
+    def seed(self, users, favorites):
+        from models import db, User, Favorite, FavoriteCount
+
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+
+            names = [breed['name'] for breed in self.app_module.breed_catalog.get_breeds()]
+            user_ids = []
+            for n in range(users):
+                user = User.signup(username=f"bench{n}", email=f"bench{n}@example.com",
+                                   password=PASSWORD, image_url=None)
+                db.session.flush()
+                db.session.add_all(Favorite(user_id=user.id, breed_name=name)
+                                   for name in names[n % len(names):][:favorites])
+                user_ids.append(user.id)
+            db.session.commit()
+            FavoriteCount.reconcile()
+            db.session.commit()
+
+        return user_ids
+
+    def throwaway_user(self, i):
+        from models import db, User
+
+        with self.app.app_context():
+            user = User.signup(username=f"throwaway{i}-{time.monotonic_ns()}",
+                               email=f"throwaway{i}@example.com", password=PASSWORD, image_url=None)
+            db.session.commit()
+            return user.id
+
+    def client(self, user_id=None):
+        client = self.app.test_client()
+        if user_id is not None:
+            self.login(client, user_id)
+        return client
+
+    def login(self, client, user_id):
+        with client.session_transaction() as sess:
+            sess[self.app_module.CURR_USER_KEY] = user_id
+
+    def scenarios(self):
+        uid = self.user_ids[0]
+        other = self.user_ids[-1]
+        breed_ids = [breed['id'] for breed in self.app_module.breed_catalog.get_breeds()]
+        breed_names = [breed['name'] for breed in self.app_module.breed_catalog.get_breeds()]
+        breed = lambda i: breed_ids[i % len(breed_ids)]
+        asset = self.app_module.assets.files['app.js']
+        token = self.app.config['METRICS_TOKEN']
+        metrics_auth = {'Authorization': f"Bearer {token}"} if token else None
+        edit = {'username': 'bench0', 'email': 'bench0@example.com', 'image_url': '', 'password': PASSWORD}
+
+        return [
+            Scenario('index', '/', concurrent=True),
+            Scenario('index (logged in)', '/', user=True, concurrent=True),
+            Scenario('oops', '/oops', concurrent=True),
+            Scenario('breed_info', lambda i: f'/cats/{breed(i)}', concurrent=True),
+            Scenario('breed_info (logged in)', lambda i: f'/cats/{breed(i)}', user=True, concurrent=True),
+            Scenario('breed_info (invalid)', '/cats/nosuchbreed', concurrent=True),
+            Scenario('filter_breeds', '/api/breeds?energy_level=5&page=1', concurrent=True),
+            Scenario('search_breeds', lambda i: f'/api/breeds/search?q={breed_names[i % len(breed_names)][:3]}',
+                     concurrent=True),
+            Scenario('similar_breeds', lambda i: f'/api/breeds/{breed(i)}/similar', concurrent=True),
+            Scenario('popular_breeds', '/api/breeds/popular', concurrent=True),
+            Scenario('breed_popularity', lambda i: f'/api/breeds/{breed(i)}/popularity', concurrent=True),
+            Scenario('show_random_cat', '/random', concurrent=True),
+            Scenario('show_user_profile', f'/users/{other}', user=True, concurrent=True),
+            Scenario('list_user_favorites', f'/api/users/{other}/favorites', user=True, concurrent=True),
+            Scenario('edit_user_profile', f'/users/{uid}/edit', user=True, concurrent=True),
+            Scenario('edit_user_profile (POST)', f'/users/{uid}/edit', 'POST', data=edit, user=True),
+            Scenario('toggle_fav', '/api/togglefav', 'POST',
+                     json=lambda i: {'breed_name': breed_names[i % len(breed_names)]}, user=True),
+            Scenario('favorites_batch', '/api/favorites/batch', 'POST',
+                     json=lambda i: {'ops': [{'op': ('add', 'remove')[i % 2], 'breed_name': name}
+                                             for name in breed_names[:6]]},
+                     user=True),
+            Scenario('signup', '/signup'),
+            Scenario('signup (POST)', '/signup', 'POST',
+                     data=lambda i: {'username': f'new{i}-{time.monotonic_ns()}', 'email': f'new{i}@example.com',
+                                     'password': PASSWORD, 'image_url': ''}),
+            Scenario('login', '/login'),
+            Scenario('login (POST)', '/login', 'POST', data={'username': 'bench0', 'password': PASSWORD}),
+            Scenario('logout', '/logout', 'POST', user=True),
+            Scenario('delete_user', '/users/delete', 'POST', prepare=self.throwaway_user),
+            Scenario('static', '/static/app.js', concurrent=True),
+            Scenario('static_asset', f'/static/{asset}', concurrent=True),
+            Scenario('static_asset (gzip)', f'/static/{asset}', headers={'Accept-Encoding': 'gzip'},
+                     concurrent=True),
+            Scenario('metrics', '/metrics', headers=metrics_auth, concurrent=True),
+        ]
+
+    def run_once(self, scenario, client, i):
+        if scenario.prepare is not None:
+            self.login(client, scenario.prepare(i))
+        elif scenario.user:
+            self.login(client, self.user_ids[0])
+
+        start = time.perf_counter()
+        response = scenario.request(client, i)
+        elapsed = time.perf_counter() - start
+        response.close()
+
+        return elapsed, response.status_code >= 400
+
+    def sequential(self, scenario, iterations, warmup):
+        client = self.client()
+        for i in range(warmup):
+            self.run_once(scenario, client, i)
+
+        latencies = []
+        errors = 0
+        queries = self.queries.count
+        start = time.perf_counter()
+        for i in range(iterations):
+            elapsed, failed = self.run_once(scenario, client, warmup + i)
+            latencies.append(elapsed)
+            errors += failed
+
+        return summarize(latencies, time.perf_counter() - start, self.queries.count - queries, errors)
+
+    def concurrent(self, scenario, iterations, threads):
+        latencies = []
+        errors = [0]
+        local = threading.local()
+
+        def one(i):
+            if not hasattr(local, 'client'):
+                local.client = self.client()
+            elapsed, failed = self.run_once(scenario, local.client, i)
+            with self.lock:
+                latencies.append(elapsed)
+                errors[0] += failed
+
+        queries = self.queries.count
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(one, range(iterations)))
+
+        return summarize(latencies, time.perf_counter() - start, self.queries.count - queries, errors[0])
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--iterations', type=int, default=200, help="timed requests per route")
+    parser.add_argument('--warmup', type=int, default=10, help="untimed requests per route first")
+    parser.add_argument('--concurrency', type=int, default=8, help="threads for the concurrent runs")
+    parser.add_argument('--latency', type=float, default=0.05, help="seconds the stub adds to each response")
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--favorites', type=int, default=5, help="favorites per seeded user")
+    parser.add_argument('--only', action='append', help="only run routes whose name contains this")
+    parser.add_argument('--output', help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    stub = StubCatAPI(latency=args.latency).start()
+    os.environ['CAT_API_BASE_URL'] = stub.url
+    os.environ['DATABASE_URL'] = os.environ.get('BENCH_DATABASE_URL', 'postgresql:///cat_finder_bench')
+    os.environ.setdefault('BCRYPT_LOG_ROUNDS', '4')
+    os.environ.setdefault('BREED_SNAPSHOT_PATH', '')
+
+    # Fingerprinted copies for the static_asset routes, as bin/post_compile
+    # makes on deploy; the app reads the manifest when it's imported. Removed
+    # afterwards unless they were already there, so that `flask run` doesn't
+    # keep serving copies of files that have since been edited.
+    import assets
+    dist = os.path.join(ROOT, 'static', 'dist')
+    if not os.path.exists(dist):
+        atexit.register(shutil.rmtree, dist, True)
+    assets.build(os.path.join(ROOT, 'static'))
+
+    import app as app_module
+
+    app_module.app.config['WTF_CSRF_ENABLED'] = False
+    app_module.app.config['DEBUG_TB_ENABLED'] = False
+
+    bench = Bench(app_module, args.users, args.favorites)
+    results = {}
+
+    for scenario in bench.scenarios():
+        if args.only and not any(name in scenario.name for name in args.only):
+            continue
+
+        print(f"{scenario.name}...", file=sys.stderr)
+        results[scenario.name] = {'sequential': bench.sequential(scenario, args.iterations, args.warmup)}
+        if scenario.concurrent:
+            results[scenario.name]['concurrent'] = bench.concurrent(scenario, args.iterations, args.concurrency)
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'python': platform.python_version(),
+            'upstream_latency_s': args.latency,
+            'iterations': args.iterations,
+            'warmup': args.warmup,
+            'concurrency': args.concurrency,
+            'upstream_requests': len(stub.requests),
+        },
+        'results': results,
+    }
+
+    stub.stop()
+    output = json.dumps(report, indent=2, sort_keys=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Bitmap index for filtering breeds by trait level."""
+
+FILTER_TRAITS = ('energy_level', 'intelligence', 'social_needs', 'hypoallergenic')
+
+
+class TraitBitmaps:
+    """Per-trait, per-level bitmaps over one version of the catalog.
+
+    Bit i of `bitmaps[trait][level]` is set when the i-th breed has that level,
+    so a filter is answered by AND-ing a few integers together.
+    """
+
+    def __init__(self, index):
+        self.version = index.version
+        self.breeds = index.breeds
+        self.all = (1 << len(self.breeds)) - 1
+        self.bitmaps = {trait: {} for trait in FILTER_TRAITS}
+
+        for i, breed in enumerate(self.breeds):
+            for trait in FILTER_TRAITS:
+                level = breed.get(trait)
+                levels = self.bitmaps[trait]
+                levels[level] = levels.get(level, 0) | (1 << i)
+
+    def match(self, levels):
+        """Bitmap of breeds having every trait level in `levels`."""
+
+        mask = self.all
+        for trait, level in levels.items():
+            mask &= self.bitmaps[trait].get(level, 0)
+        return mask
+
+    def count(self, mask):
+        return bin(mask).count('1')
+
+    def select(self, mask, offset=0, limit=None):
+        """The breeds in `mask`, in catalog order, skipping `offset` of them."""
+
+        breeds = []
+        i = 0
+        while mask and (limit is None or len(breeds) < limit):
+            low = mask & -mask
+            if i >= offset:
+                breeds.append(self.breeds[low.bit_length() - 1])
+            i += 1
+            mask ^= low
+        return breeds
+
+    def page(self, levels, page=1, per_page=24):
+        """One page of the breeds matching `levels`, plus the total match count."""
+
+        mask = self.match(levels)
+        return self.select(mask, (page - 1) * per_page, per_page), self.count(mask)
@@ -0,0 +1,138 @@
+"""In-memory breed search for typeahead: a prefix trie plus a trigram index for typos."""
+
+import unicodedata
+
+# What a term was taken from, best match first.
+NAME, NAME_WORD, ALT_NAME, ORIGIN = range(4)
+MATCH_KINDS = ('name', 'name', 'alt_name', 'origin')
+
+MIN_SIMILARITY = 0.3
+
+
+def normalize(text):
+    """Lowercase `text`, strip accents and collapse everything but letters and digits to single spaces."""
+
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c if c.isalnum() else ' ' for c in text if not unicodedata.combining(c))
+    return ' '.join(text.lower().split())
+
+
+def trigrams(term):
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def breed_terms(breed):
+    """(term, kind) pairs a breed can be found by."""
+
+    name = normalize(breed['name'])
+    yield name, NAME
+    for word in name.split()[1:]:
+        yield word, NAME_WORD
+
+    for alt_name in (breed.get('alt_names') or '').split(','):
+        alt_name = normalize(alt_name)
+        if alt_name:
+            yield alt_name, ALT_NAME
+            for word in alt_name.split()[1:]:
+                yield word, ALT_NAME
+
+    origin = normalize(breed.get('origin'))
+    if origin:
+        yield origin, ORIGIN
+        for word in origin.split()[1:]:
+            yield word, ORIGIN
+
+
+class BreedSearch:
+    """Search index over one version of the catalog, built with BreedCatalog.derive().
+
+    Every node of the trie keeps its matches already ranked, so a prefix
+    lookup is one step per character of the query. Queries that don't
+    prefix anything fall back to trigram similarity, which copes with typos.
+    """
+
+    def __init__(self, index):
+        self.version = index.version
+        self.breeds = index.breeds
+        self.trie = {}
+        self.terms = []
+        self.postings = {}
+
+        for i, breed in enumerate(self.breeds):
+            for term, kind in breed_terms(breed):
+                self._insert(term, i, kind)
+
+                term_id = len(self.terms)
+                grams = trigrams(term)
+                self.terms.append((i, kind, len(grams)))
+                for gram in grams:
+                    self.postings.setdefault(gram, []).append(term_id)
+
+        self._rank(self.trie)
+
+    def search(self, query, limit=10):
+        """Up to `limit` (breed, match kind) pairs for `query`, best first."""
+
+        query = normalize(query)
+        if not query:
+            return []
+
+        results = []
+        seen = set()
+
+        for i, kind in self._prefix_matches(query):
+            results.append((self.breeds[i], MATCH_KINDS[kind]))
+            seen.add(i)
+            if len(results) == limit:
+                return results
+
+        if len(query) >= 3:
+            for i in self._similar(query):
+                if i not in seen:
+                    results.append((self.breeds[i], 'fuzzy'))
+                    if len(results) == limit:
+                        break
+
+        return results
+
+    def _insert(self, term, i, kind):
+        node = self.trie
+        for char in term:
+            node = node.setdefault(char, {})
+            matches = node.setdefault('', {})
+            if kind < matches.get(i, len(MATCH_KINDS)):
+                matches[i] = kind
+
+    def _rank(self, node):
+        for char, child in node.items():
+            if char == '':
+                node[''] = tuple(sorted(child.items(), key=lambda match: (match[1], self.breeds[match[0]]['name'])))
+            else:
+                self._rank(child)
+
+    def _prefix_matches(self, query):
+        node = self.trie
+        for char in query:
+            node = node.get(char)
+            if node is None:
+                return ()
+        return node['']
+
+    def _similar(self, query):
+        """Breed positions with a term similar to `query`, most similar first."""
+
+        grams = trigrams(query)
+        shared = {}
+        for gram in grams:
+            for term_id in self.postings.get(gram, ()):
+                shared[term_id] = shared.get(term_id, 0) + 1
+
+        best = {}
+        for term_id, count in shared.items():
+            i, kind, size = self.terms[term_id]
+            similarity = count / (len(grams) + size - count)
+            if similarity >= MIN_SIMILARITY and (similarity, -kind) > best.get(i, (0, 0)):
+                best[i] = (similarity, -kind)
+
+        return sorted(best, key=lambda i: (-best[i][0], -best[i][1], self.breeds[i]['name']))
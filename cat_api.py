@@ -0,0 +1,167 @@
+"""Client for The Cat API.
+
+All calls share one pooled keep-alive session, have per-endpoint timeouts, are
+retried a bounded number of times with jittered backoff, and go through a
+circuit breaker so that an unhealthy upstream fails fast instead of tying up
+workers.
+"""
+
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from auth import API_KEY
+
+BASE_URL = "https://api.thecatapi.com/v1"
+
+# (connect, read) timeouts in seconds for each endpoint.
+TIMEOUTS = {
+    'breeds': (3.05, 10),
+    'images/search': (3.05, 4),
+}
+DEFAULT_TIMEOUT = (3.05, 5)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CatAPIError(Exception):
+    """The Cat API could not be reached or answered with an error."""
+
+
+class CircuitOpenError(CatAPIError):
+    """The circuit breaker is open, so the call was not attempted."""
+
+
+class CircuitBreaker:
+    """Stops calls to the upstream after `failure_threshold` failures in a row.
+
+    Once `reset_timeout` seconds have passed a single trial call is let
+    through; if it succeeds the breaker closes again, otherwise it stays open
+    for another `reset_timeout`.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        """Whether a call may be attempted right now."""
+
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class CatAPIClient:
+    """Makes requests to The Cat API over a pooled session.
+
+    If given, `observe(endpoint, status, seconds)` is called after every
+    attempt, with the HTTP status as a string, 'error' if there was no
+    response, or 'circuit_open' if the call wasn't attempted.
+    """
+
+    def __init__(self, base_url=BASE_URL, headers=API_KEY, timeouts=None,
+                 retries=2, backoff=0.2, pool_size=10, breaker=None, observe=None):
+        self.base_url = base_url.rstrip('/')
+        self.observe = observe
+        self.timeouts = {**TIMEOUTS, **(timeouts or {})}
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+
+        self.session = requests.Session()
+        self.session.headers.update({k: v for k, v in headers.items() if v})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get_breeds(self):
+        """Return the full list of breeds."""
+
+        return self.get('breeds')
+
+    def search_images(self, breed_id, limit=5):
+        """Return up to `limit` images of a breed."""
+
+        return self.get('images/search', params={"breed_ids": breed_id, "limit": limit})
+
+    def get(self, endpoint, params=None):
+        """GET `endpoint` and return the decoded JSON.
+
+        Raises CatAPIError once retries are exhausted, or CircuitOpenError
+        straight away if the upstream is known to be unhealthy.
+        """
+
+        if not self.breaker.allow():
+            self._observe(endpoint, 'circuit_open', 0.0)
+            raise CircuitOpenError(f"Not calling {endpoint}, circuit is open")
+
+        timeout = self.timeouts.get(endpoint, DEFAULT_TIMEOUT)
+        url = f'{self.base_url}/{endpoint}'
+
+        for attempt in range(self.retries + 1):
+            start = time.perf_counter()
+            try:
+                res = self.session.get(url, params=params, timeout=timeout)
+            except requests.RequestException as e:
+                self._observe(endpoint, 'error', time.perf_counter() - start)
+                error = CatAPIError(f"{endpoint}: {e}")
+            else:
+                self._observe(endpoint, str(res.status_code), time.perf_counter() - start)
+                if res.status_code < 400:
+                    try:
+                        data = res.json()
+                    except ValueError as e:
+                        error = CatAPIError(f"{endpoint}: invalid JSON ({e})")
+                    else:
+                        self.breaker.record_success()
+                        return data
+                else:
+                    error = CatAPIError(f"{endpoint}: HTTP {res.status_code}")
+                    if res.status_code not in RETRY_STATUSES:
+                        # The upstream is healthy, it just didn't like the request.
+                        self.breaker.record_success()
+                        raise error
+
+            if attempt < self.retries:
+                time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+        self.breaker.record_failure()
+        raise error
+
+    def _observe(self, endpoint, status, seconds):
+        if self.observe is not None:
+            self.observe(endpoint, status, seconds)
@@ -0,0 +1,305 @@
+"""In-process cache of the breed catalog from The Cat API."""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout of snapshot files changes, so old files are ignored.
+SNAPSHOT_FORMAT = 1
+
+
+def catalog_digest(breeds):
+    """Short hash identifying the contents of a catalog."""
+
+    payload = json.dumps(breeds, sort_keys=True).encode('utf-8')
+    return hashlib.sha1(payload).hexdigest()[:16]
+
+
+def save_snapshot(path, breeds, saved_at=None):
+    """Write the catalog to `path`, replacing any previous snapshot atomically."""
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    snapshot = {
+        'format': SNAPSHOT_FORMAT,
+        'saved_at': time.time() if saved_at is None else saved_at,
+        'digest': catalog_digest(breeds),
+        'breeds': breeds,
+    }
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.breeds-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_snapshot(path):
+    """Read a snapshot written by save_snapshot.
+
+    Returns None if there is no usable snapshot at `path`.
+    """
+
+    try:
+        with open(path) as f:
+            snapshot = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        logger.warning("Ignoring unreadable breed snapshot at %s", path)
+        return None
+
+    if snapshot.get('format') != SNAPSHOT_FORMAT or not snapshot.get('breeds'):
+        return None
+
+    return snapshot
+
+
+class BreedIndex:
+    """Read-only view of one version of the catalog, keyed by id and by name.
+
+    Built once whenever the catalog changes so that routes can look up a breed
+    without scanning the whole list.
+    """
+
+    __slots__ = ('version', 'digest', 'breeds', 'ids', 'by_id', 'by_name')
+
+    def __init__(self, breeds, version, digest=None):
+        self.version = version
+        self.digest = digest or catalog_digest(breeds)
+        self.breeds = tuple(breeds)
+        self.ids = tuple(breed['id'] for breed in self.breeds)
+        self.by_id = MappingProxyType({breed['id']: breed for breed in self.breeds})
+        self.by_name = MappingProxyType({breed['name']: breed for breed in self.breeds})
+
+    def __len__(self):
+        return len(self.breeds)
+
+    def __repr__(self):
+        return f"<BreedIndex v{self.version}: {len(self.breeds)} breeds>"
+
+
+class BreedCatalog:
+    """Breed catalog cached for `ttl` seconds.
+
+    When the cached copy expires it keeps being served while a single
+    background thread fetches a fresh one. Only a cold cache makes the caller
+    wait on the upstream request. A failed refresh is retried no sooner than
+    `retry_interval` seconds later.
+
+    With a `snapshot_path`, every fetched catalog is also written to disk, so
+    a new process can start from it with load_snapshot() instead of waiting
+    on the upstream, and processes sharing the file can pick up each other's
+    refreshes. With a `refresh_interval`, ensure_refresher() keeps the
+    catalog fresh from a background thread.
+    """
+
+    def __init__(self, fetch, ttl=3600, retry_interval=30, snapshot_path=None,
+                 refresh_interval=0):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self.snapshot_path = snapshot_path
+        self.refresh_interval = refresh_interval
+
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.refresh_failures = 0
+        self.version = 0
+
+        self._index = None
+        self._derived = {}
+        self._fetched_at = 0.0
+        self._next_attempt = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._refresher_pid = None
+
+    @property
+    def is_loaded(self):
+        """Whether a catalog is cached, even a stale one."""
+
+        return self._index is not None
+
+    def get_breeds(self):
+        """Return the breed dicts, fetching them if nothing is cached."""
+
+        return self.get_index().breeds
+
+    def get_index(self):
+        """Return the BreedIndex for the cached catalog, fetching it if needed."""
+
+        index = self._index
+
+        if index is None:
+            return self._load()
+
+        now = time.monotonic()
+        if now - self._fetched_at > self.ttl:
+            self.stale_hits += 1
+            if now >= self._next_attempt:
+                self._refresh_in_background()
+        else:
+            self.hits += 1
+
+        return index
+
+    def derive(self, build):
+        """Return `build(index)` for the current catalog.
+
+        The result is kept until the catalog changes, so anything computed
+        from the catalog (lookup tables, search indexes...) is built once per
+        version.
+        """
+
+        index = self.get_index()
+        cached = self._derived.get(build)
+
+        if cached is None or cached[0] != index.version:
+            cached = (index.version, build(index))
+            self._derived[build] = cached
+
+        return cached[1]
+
+    def refresh(self):
+        """Fetch the catalog now and swap it in."""
+
+        breeds = self.fetch()
+        self._store(breeds)
+
+        if self.snapshot_path:
+            try:
+                save_snapshot(self.snapshot_path, breeds)
+            except OSError:
+                logger.exception("Could not save the breed snapshot to %s", self.snapshot_path)
+
+    def load_snapshot(self):
+        """Start from the snapshot on disk, if there is one.
+
+        An old snapshot is still loaded; it is just already stale, so the next
+        request triggers a background refresh. Returns whether a snapshot was
+        loaded.
+        """
+
+        if not self.snapshot_path:
+            return False
+
+        snapshot = load_snapshot(self.snapshot_path)
+        if snapshot is None:
+            return False
+
+        age = max(time.time() - snapshot['saved_at'], 0)
+        self._store(snapshot['breeds'], digest=snapshot['digest'],
+                    fetched_at=time.monotonic() - age)
+        return True
+
+    def ensure_refresher(self):
+        """Start the periodic refresh thread in this process if it isn't running.
+
+        Threads started before gunicorn forks its workers don't survive the
+        fork, so this is called per request rather than at import.
+        """
+
+        if self._refresher_pid == os.getpid() or self.refresh_interval <= 0:
+            return
+
+        with self._lock:
+            if self._refresher_pid == os.getpid():
+                return
+            self._refresher_pid = os.getpid()
+
+        threading.Thread(target=self._run_refresher, daemon=True, name='catalog-refresh').start()
+
+    def clear(self):
+        """Forget the cached catalog."""
+
+        with self._lock:
+            self._index = None
+            self._fetched_at = 0.0
+
+    def stats(self):
+        """Counters describing how the cache is doing."""
+
+        age = time.monotonic() - self._fetched_at if self._index is not None else None
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale_hits': self.stale_hits,
+            'refresh_failures': self.refresh_failures,
+            'version': self.version,
+            'age': age,
+        }
+
+    def _load(self):
+        with self._lock:
+            if self._index is None:
+                self.misses += 1
+                self.refresh()
+            else:
+                self.hits += 1
+
+            return self._index
+
+    def _store(self, breeds, digest=None, fetched_at=None):
+        digest = digest or catalog_digest(breeds)
+
+        # Only a change in contents makes a new version, so whatever was
+        # derived from the catalog survives a refresh that changed nothing.
+        if self._index is None or self._index.digest != digest:
+            self._index = BreedIndex(breeds, self.version + 1, digest)
+            self.version = self._index.version
+
+        self._fetched_at = time.monotonic() if fetched_at is None else fetched_at
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        threading.Thread(target=self._background_refresh, daemon=True).start()
+
+    def _refresh_from_snapshot(self):
+        """Adopt a snapshot written by another process if it is fresh enough."""
+
+        snapshot = load_snapshot(self.snapshot_path) if self.snapshot_path else None
+        if snapshot is None:
+            return False
+
+        age = max(time.time() - snapshot['saved_at'], 0)
+        fetched_at = time.monotonic() - age
+        if age > (self.refresh_interval or self.ttl) or fetched_at <= self._fetched_at:
+            return False
+
+        self._store(snapshot['breeds'], digest=snapshot['digest'], fetched_at=fetched_at)
+        return True
+
+    def _run_refresher(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            if time.monotonic() - self._fetched_at > self.refresh_interval:
+                self._refresh_in_background()
+
+    def _background_refresh(self):
+        try:
+            if not self._refresh_from_snapshot():
+                self.refresh()
+        except Exception:
+            self.refresh_failures += 1
+            self._next_attempt = time.monotonic() + self.retry_interval
+            logger.exception("Could not refresh the breed catalog, still serving the stale copy")
+        finally:
+            self._refreshing = False
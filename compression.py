@@ -0,0 +1,69 @@
+"""gzip and brotli compression of rendered responses."""
+
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = frozenset([
+    'text/html',
+    'text/css',
+    'text/plain',
+    'application/json',
+    'application/javascript',
+    'text/javascript',
+    'image/svg+xml',
+])
+
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def best_encoding():
+    """The encoding the client prefers out of those we can produce, or None."""
+
+    return request.accept_encodings.best_match(ENCODINGS)
+
+
+def compress(data, encoding, level=6):
+    if encoding == 'br':
+        return brotli.compress(data, quality=min(level, 11))
+    return gzip.compress(data, level, mtime=0)
+
+
+def compress_response(response, min_size=500, level=6):
+    """Compress `response` in place if the client accepts it and it's worth it.
+
+    Bodies smaller than `min_size` bytes are sent as is; they fit in a packet
+    or two anyway. A strong ETag gets the encoding appended, as the bytes
+    sent differ from the uncompressed ones.
+    """
+
+    if (response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    response.vary.add('Accept-Encoding')
+
+    encoding = best_encoding()
+    if encoding is None:
+        return response
+
+    response.set_data(compress(data, encoding, level))
+    response.headers['Content-Encoding'] = encoding
+
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f"{etag}-{encoding}")
+
+    return response
@@ -0,0 +1,30 @@
+"""Cache of rendered HTML fragments that depend only on the breed catalog."""
+
+from markupsafe import Markup
+
+
+class RenderedFragments:
+    """Pre-rendered HTML for one version of the catalog.
+
+    Built with BreedCatalog.derive(), so a new, empty set of fragments replaces
+    this one whenever the catalog changes.
+    """
+
+    def __init__(self, index):
+        self.version = index.version
+        self.hits = 0
+        self.misses = 0
+        self._fragments = {}
+
+    def get(self, key, render):
+        """Return the fragment for `key`, calling `render()` to build it the first time."""
+
+        fragment = self._fragments.get(key)
+
+        if fragment is None:
+            self.misses += 1
+            fragment = self._fragments.setdefault(key, Markup(render()))
+        else:
+            self.hits += 1
+
+        return fragment
@@ -0,0 +1,41 @@
+"""gunicorn settings, read automatically when gunicorn starts in this directory.
+
+GUNICORN_WORKER_CLASS=gevent runs each worker as an event loop instead of one
+request at a time, so a worker can wait on hundreds of Cat API calls at once.
+Blocking I/O (requests, psycopg2, time.sleep) is patched to yield to other
+requests, so the views stay as they are.
+"""
+
+import os
+import shutil
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+
+if worker_class == 'gevent':
+    # This has to happen before the app is imported (gunicorn's --preload
+    # imports it in the master), or the locks, threads and sockets it makes
+    # at import time would be the unpatched, blocking kind.
+    from gevent import monkey
+    monkey.patch_all()
+
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+
+    worker_connections = int(os.environ.get('GEVENT_WORKER_CONNECTIONS', 500))
+
+    # Image searches are handed to a pool of (now green) threads; let it hold
+    # as many as there can be requests waiting on one.
+    os.environ.setdefault('UPSTREAM_WORKERS', str(worker_connections))
+
+# Each worker writes its metrics to files here so that /metrics can add them
+# up. It has to be set, and emptied of any previous run's samples, before the
+# app and prometheus_client are imported.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/catfinder-metrics')
+shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'])
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
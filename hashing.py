@@ -0,0 +1,140 @@
+"""Password hashing that runs bcrypt outside of the request worker."""
+
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+
+class HasherBusy(Exception):
+    """Too many passwords are already waiting to be hashed, or one took too long."""
+
+
+def _hash_password(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check_password(hashed, password):
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    except ValueError:
+        return False
+
+
+def hash_rounds(hashed):
+    """The work factor a bcrypt hash was made with, e.g. 12 for '$2b$12$...'."""
+
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """Hashes and checks passwords with bcrypt in a pool of `workers` processes.
+
+    At most `max_queue` hashes may wait for a free process; beyond that
+    HasherBusy is raised straight away, so a burst of logins can't tie up
+    every request worker. With `workers=0` hashing runs inline.
+    """
+
+    def __init__(self, rounds=12, workers=2, max_queue=16, timeout=10):
+        self.configure(rounds, workers, max_queue, timeout)
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+
+    def configure(self, rounds=12, workers=2, max_queue=16, timeout=10):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+
+    def hash(self, password):
+        """Return a bcrypt hash of `password` using the configured work factor."""
+
+        if not password:
+            raise ValueError("Password must be non-empty.")
+
+        return self._run(_hash_password, password, self.rounds)
+
+    def check(self, hashed, password):
+        """Whether `password` matches the bcrypt hash `hashed`."""
+
+        if not hashed or not password:
+            return False
+
+        return self._run(_check_password, hashed, password)
+
+    def needs_rehash(self, hashed):
+        """Whether `hashed` was made with a different work factor than configured."""
+
+        return hash_rounds(hashed) != self.rounds
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+
+        for attempt in range(2):
+            pool = self._get_pool()
+            try:
+                return self._submit(pool, fn, *args).result(timeout=self.timeout)
+            except BrokenProcessPool:
+                # One of the processes died (killed for using too much memory,
+                # say) and the pool won't take any more work; start a new one.
+                self._discard_pool(pool)
+                if attempt:
+                    raise
+            except TimeoutError:
+                raise HasherBusy()
+
+    def _submit(self, pool, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+
+        try:
+            future = pool.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _get_pool(self):
+        # Each gunicorn worker needs its own pool; one created before the fork
+        # would belong to the master process.
+        if self._pool is None or self._pool_pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pool_pid != os.getpid():
+                    self._pool = _make_pool(self.workers)
+                    self._pool_pid = os.getpid()
+
+        return self._pool
+
+    def _discard_pool(self, pool):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False)
+
+
+def _make_pool(workers):
+    # Under gevent's monkey patching a process pool's helper threads would be
+    # greenlets. bcrypt releases the GIL, so real threads from gevent's own
+    # pool hash in parallel without blocking the other requests.
+    if 'gevent' in sys.modules:
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            from gevent.threadpool import ThreadPoolExecutor
+            return ThreadPoolExecutor(max_workers=workers)
+
+    # Started from a fresh server process rather than forked from this one:
+    # by now the worker is running the catalog refresh, prefetch and upstream
+    # threads, and a forked child could inherit one of their locks held.
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('forkserver'))
@@ -0,0 +1,85 @@
+"""HTTP caching helpers: strong ETags and 304 Not Modified responses."""
+
+import hashlib
+import os
+from functools import wraps
+
+from flask import g, make_response, request
+
+
+def files_digest(*folders):
+    """Short hash of every file under `folders`, used to version rendered output."""
+
+    sha = hashlib.sha1()
+
+    for folder in folders:
+        for root, dirs, files in os.walk(folder):
+            dirs.sort()
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                sha.update(os.path.relpath(path, folder).encode('utf-8'))
+                with open(path, 'rb') as f:
+                    sha.update(f.read())
+
+    return sha.hexdigest()[:16]
+
+
+def make_etag(*parts):
+    """A strong ETag value built from `parts`."""
+
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()[:24]
+
+
+def matching_etag(etag):
+    """The tag in If-None-Match that matches `etag` or one of its compressed variants."""
+
+    for candidate in (etag, f"{etag}-gzip", f"{etag}-br"):
+        if request.if_none_match.contains(candidate):
+            return candidate
+
+    return None
+
+
+def public_when_unchanged(etag_for, is_personalized):
+    """Make a view publicly cacheable, revalidated with a strong ETag.
+
+    `etag_for` gets the view's arguments and returns the ETag the response
+    will have, or None if the view should run as normal (it's asked again
+    once the view has run). A matching If-None-Match gets a 304 without
+    calling the view at all.
+
+    When `is_personalized()` is true the view runs as normal and the default
+    private policy applies. A view can also set `g.skip_http_cache` to keep a
+    degraded response (say, one missing data from a failed upstream call)
+    from being cached.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if is_personalized():
+                return view(*args, **kwargs)
+
+            etag = etag_for(*args, **kwargs)
+            matched = etag and matching_etag(etag)
+            if matched:
+                response = make_response('', 304)
+                etag = matched
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or g.get('skip_http_cache'):
+                    return response
+                if etag is None:
+                    # The view may have just cached what the tag depends on.
+                    etag = etag_for(*args, **kwargs)
+                    if etag is None:
+                        return response
+
+            response.set_etag(etag)
+            response.cache_control.public = True
+            response.cache_control.no_cache = True
+            return response
+
+        return wrapper
+
+    return decorator
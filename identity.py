@@ -0,0 +1,59 @@
+"""Short-lived per-worker cache of logged in users."""
+
+import threading
+import time
+
+from sqlalchemy.orm import make_transient_to_detached
+
+from models import db, User
+
+
+class UserCache:
+    """Keeps users' column values for `ttl` seconds, keyed by id.
+
+    A cached user is rebuilt and merged into the current session without
+    querying the database. Call invalidate() whenever a user is changed or
+    deleted.
+    """
+
+    def __init__(self, ttl=30, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def load(self, user_id):
+        """Return the User with `user_id`, or None if there isn't one."""
+
+        entry = self._entries.get(user_id)
+
+        if entry is None or time.monotonic() > entry[0]:
+            self.misses += 1
+            user = User.query.get(user_id)
+            if user is not None:
+                self._put(user)
+            return user
+
+        self.hits += 1
+        user = User(**entry[1])
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _put(self, user):
+        values = {column.key: getattr(user, column.key) for column in User.__table__.columns}
+
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[user.id] = (time.monotonic() + self.ttl, values)
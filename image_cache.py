@@ -0,0 +1,190 @@
+"""Cache of breed image search results, with a background prefetcher."""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class ImageCache:
+    """LRU cache of image search results keyed by (breed_id, limit).
+
+    Entries expire after `ttl` seconds. The least recently used entries are
+    evicted once there are more than `max_entries` of them or their JSON size
+    adds up to more than `max_bytes`.
+    """
+
+    def __init__(self, fetch, ttl=3600, max_entries=256, max_bytes=1_000_000):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.views = Counter()
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, breed_id, limit):
+        """Return the cached images, or None if they need to be fetched."""
+
+        key = (breed_id, limit)
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None or time.monotonic() > entry[0]:
+                if entry is not None:
+                    self._discard(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def load(self, breed_id, limit):
+        """Fetch images from upstream and cache them."""
+
+        imgs = self.fetch(breed_id, limit=limit)
+        self.put(breed_id, limit, imgs)
+        return imgs
+
+    def get(self, breed_id, limit):
+        """Return images for a breed, from the cache when possible."""
+
+        imgs = self.lookup(breed_id, limit)
+        if imgs is None:
+            imgs = self.load(breed_id, limit)
+        return imgs
+
+    def is_fresh(self, breed_id, limit):
+        entry = self._entries.get((breed_id, limit))
+        return entry is not None and time.monotonic() <= entry[0]
+
+    def digest(self, breed_id, limit):
+        """Short hash of the cached images, or None if they need to be fetched.
+
+        Changes whenever the images are refetched, so it can go into an ETag
+        for a page that shows them. Doesn't count as a hit or a miss.
+        """
+
+        entry = self._entries.get((breed_id, limit))
+        if entry is None or time.monotonic() > entry[0]:
+            return None
+        return entry[3]
+
+    def put(self, breed_id, limit, imgs):
+        key = (breed_id, limit)
+        content = json.dumps(imgs).encode('utf-8')
+        size = len(content)
+        digest = hashlib.sha1(content).hexdigest()[:16]
+
+        with self._lock:
+            if key in self._entries:
+                self._discard(key)
+
+            self._entries[key] = (time.monotonic() + self.ttl, size, imgs, digest)
+            self._bytes += size
+
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or self._bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+                self.evictions += 1
+
+    def record_view(self, breed_id):
+        """Count a view of a breed page, used to decide what to prefetch."""
+
+        self.views[breed_id] += 1
+
+    def most_viewed(self, n):
+        return [breed_id for breed_id, _ in self.views.most_common(n)]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Counters describing how the cache is doing."""
+
+        lookups = self.hits + self.misses
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+        }
+
+    def _discard(self, key):
+        size = self._entries.pop(key)[1]
+        self._bytes -= size
+
+
+class ImagePrefetcher:
+    """Keeps the image cache warm for the breeds people are most likely to visit.
+
+    Every `interval` seconds it fetches images for the `top_n` most viewed
+    breeds and for the breed ids returned by `popular_breeds(top_n)`, skipping
+    any that are already cached.
+    """
+
+    def __init__(self, cache, popular_breeds, interval=300, top_n=10, limit=5):
+        self.cache = cache
+        self.popular_breeds = popular_breeds
+        self.interval = interval
+        self.top_n = top_n
+        self.limit = limit
+        self.prefetched = 0
+
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        """Start the background thread in this process if it isn't running.
+
+        Called per request rather than at import, because gunicorn's --preload
+        imports the app before forking and threads don't survive the fork.
+        """
+
+        if self._pid == os.getpid() or self.interval <= 0:
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+
+        threading.Thread(target=self._run, daemon=True, name='image-prefetch').start()
+
+    def warm(self):
+        """Fetch images for every candidate breed not already cached."""
+
+        candidates = self.cache.most_viewed(self.top_n)
+        candidates += [b for b in self.popular_breeds(self.top_n) if b not in candidates]
+
+        for breed_id in candidates:
+            if not self.cache.is_fresh(breed_id, self.limit):
+                self.cache.load(breed_id, self.limit)
+                self.prefetched += 1
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.warm()
+            except Exception:
+                logger.exception("Image prefetch failed")
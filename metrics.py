@@ -0,0 +1,93 @@
+"""Prometheus metrics for requests, Cat API calls and database queries.
+
+Under gunicorn each worker writes its samples to files in
+PROMETHEUS_MULTIPROC_DIR (set up in gunicorn.conf.py) and render() adds them
+up across workers, so /metrics shows the same totals whichever worker answers.
+"""
+
+import os
+import time
+
+from flask import g, has_request_context
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram,
+                               REGISTRY, generate_latest, multiprocess)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+REQUEST_LATENCY = Histogram(
+    'catfinder_request_duration_seconds', "Time spent handling a request.",
+    ['endpoint', 'method', 'status'])
+
+UPSTREAM_LATENCY = Histogram(
+    'catfinder_upstream_request_duration_seconds', "Time spent on each call to The Cat API.",
+    ['endpoint', 'status'])
+
+DB_QUERIES = Histogram(
+    'catfinder_db_queries_per_request', "Database queries made while handling a request.",
+    ['endpoint'], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, float('inf')))
+
+DB_TIME = Histogram(
+    'catfinder_db_time_per_request_seconds', "Time spent in database queries while handling a request.",
+    ['endpoint'], buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, float('inf')))
+
+DB_QUERIES_OUTSIDE_REQUESTS = Counter(
+    'catfinder_db_queries_outside_requests', "Database queries made by background jobs.")
+
+
+def start_request():
+    g.metrics_start = time.perf_counter()
+    g.db_queries = 0
+    g.db_time = 0.0
+
+
+def finish_request(endpoint, method, status):
+    """Record a request that was started with start_request()."""
+
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return
+
+    endpoint = endpoint or 'unknown'
+    REQUEST_LATENCY.labels(endpoint, method, status).observe(time.perf_counter() - start)
+    DB_QUERIES.labels(endpoint).observe(g.db_queries)
+    DB_TIME.labels(endpoint).observe(g.db_time)
+
+
+def observe_upstream(endpoint, status, seconds):
+    """CatAPIClient's `observe` callback."""
+
+    UPSTREAM_LATENCY.labels(endpoint, status).observe(seconds)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+
+    if has_request_context() and 'db_queries' in g:
+        g.db_queries += 1
+        g.db_time += elapsed
+    else:
+        DB_QUERIES_OUTSIDE_REQUESTS.inc()
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(context):
+    if context.connection is not None and context.connection.info.get('query_start'):
+        context.connection.info['query_start'].pop()
+
+
+def render():
+    """The current metrics in Prometheus' text format, and its content type."""
+
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    return generate_latest(registry), CONTENT_TYPE_LATEST
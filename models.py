@@ -1,8 +1,59 @@
-from flask_bcrypt import Bcrypt
-from flask_sqlalchemy import SQLAlchemy
+from contextlib import contextmanager
 
-bcrypt = Bcrypt()
-db = SQLAlchemy()
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import column, event, func, orm, values
+from sqlalchemy.dialects.postgresql import insert
+
+from hashing import PasswordHasher
+
+REPLICA = 'replica'
+
+
+class RoutingSession(SignallingSession):
+    """Sends reads made inside `db.replica()` to the read replica, if one is configured.
+
+    Everything else goes to the primary. Once the session has written
+    anything, or if `stick_to_primary` is set in its info, its reads go to the
+    primary too, so that it always sees its own writes.
+    """
+
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or getattr(clause, 'is_dml', False):
+            self.info['wrote'] = True
+        elif (self.info.get('replica_reads')
+                and not self.info.get('wrote')
+                and not self.info.get('stick_to_primary')
+                and REPLICA in (self.app.config.get('SQLALCHEMY_BINDS') or {})):
+            return self.db.get_engine(self.app, bind=REPLICA)
+
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy with a RoutingSession."""
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    @contextmanager
+    def replica(self):
+        """Let reads inside this block use the read replica."""
+
+        session = self.session()
+        previous = session.info.get('replica_reads', False)
+        session.info['replica_reads'] = True
+        try:
+            yield session
+        finally:
+            session.info['replica_reads'] = previous
+
+
+db = RoutingSQLAlchemy()
+hasher = PasswordHasher()
 
 def connect_db(app):
     """Connect this database to provided Flask app."""
@@ -10,6 +61,10 @@ def connect_db(app):
     db.app = app
     db.init_app(app)
 
+    hasher.configure(rounds=app.config.get('BCRYPT_LOG_ROUNDS', 12),
+                     workers=app.config.get('PASSWORD_HASH_WORKERS', 2),
+                     max_queue=app.config.get('PASSWORD_HASH_QUEUE', 16))
+
 class User(db.Model):
     """User in the system."""
 
@@ -54,7 +109,7 @@ class User(db.Model):
         Hashes password and adds user to system.
         """
 
-        hashed_pwd = bcrypt.generate_password_hash(password).decode('UTF-8')
+        hashed_pwd = hasher.hash(password)
 
         user = User(
             username=username,
@@ -71,16 +126,21 @@ class User(db.Model):
         """Find user with `username` and `password`.
 
         If can't find matching user (or if password is wrong), returns False.
+
+        If the password was hashed with a different work factor than the one
+        configured now, it is rehashed; the caller commits the change.
         """
 
         user = cls.query.filter_by(username=username).first()
 
         if user:
-            is_auth = bcrypt.check_password_hash(user.password, password)
+            is_auth = hasher.check(user.password, password)
             if is_auth:
+                if hasher.needs_rehash(user.password):
+                    user.password = hasher.hash(password)
                 return user
 
-        return False   
+        return False
     
 class Favorite(db.Model):
     """Favorited cats by user."""
@@ -98,6 +158,91 @@ class Favorite(db.Model):
         primary_key=True
     )
 
+    @classmethod
+    def toggle(cls, user_id, breed_name):
+        """Unfavorite the breed if the user has favorited it, otherwise favorite it.
+
+        Runs as a DELETE ... RETURNING, plus an INSERT ... ON CONFLICT DO
+        NOTHING if nothing was deleted, so it never loads the user's favorites
+        and a concurrent toggle can't cause an IntegrityError. The breed's
+        FavoriteCount is updated in the same transaction.
+
+        Returns True if the breed is now favorited.
+        """
+
+        if cls.remove_many(user_id, [breed_name]):
+            return False
+
+        cls.add_many(user_id, [breed_name])
+        return True
+
+    @classmethod
+    def add_many(cls, user_id, breed_names):
+        """Favorite several breeds with one INSERT ... ON CONFLICT DO NOTHING.
+
+        Returns the names that weren't already favorited.
+        """
+
+        if not breed_names:
+            return []
+
+        breed_names = sorted(set(breed_names))
+        table = cls.__table__
+        added = [name for (name,) in db.session.execute(
+            insert(table)
+            .values([{'user_id': user_id, 'breed_name': name} for name in breed_names])
+            .on_conflict_do_nothing()
+            .returning(table.c.breed_name)
+        )]
+
+        FavoriteCount.adjust_many({name: 1 for name in added})
+        return added
+
+    @classmethod
+    def remove_many(cls, user_id, breed_names):
+        """Unfavorite several breeds with one DELETE ... RETURNING.
+
+        Returns the names that were favorited.
+        """
+
+        if not breed_names:
+            return []
+
+        table = cls.__table__
+        removed = [name for (name,) in db.session.execute(
+            table.delete()
+            .where(table.c.user_id == user_id, table.c.breed_name.in_(breed_names))
+            .returning(table.c.breed_name)
+        )]
+
+        FavoriteCount.adjust_many({name: -1 for name in removed})
+        return removed
+
+    @classmethod
+    def page_for(cls, user_id, after=None, limit=24):
+        """One page of a user's favorited breed names, in name order.
+
+        Keyset paginated: pass the `next` name from the previous page as
+        `after`. As it only reads the columns of the (user_id, breed_name)
+        primary key, each page is an index-only scan of that index however
+        many favorites the user has.
+
+        Returns (names, next), where next is None on the last page.
+        """
+
+        table = cls.__table__
+        query = (db.select(table.c.breed_name)
+                 .where(table.c.user_id == user_id)
+                 .order_by(table.c.breed_name)
+                 .limit(limit + 1))
+        if after is not None:
+            query = query.where(table.c.breed_name > after)
+
+        names = db.session.execute(query).scalars().all()
+        if len(names) > limit:
+            return names[:limit], names[limit - 1]
+        return names, None
+
     def serialize(self):
         """Returns a dict representation of cupcake, which can be turned into JSON"""
         return {
@@ -106,4 +251,185 @@ class Favorite(db.Model):
         }
 
     def __repr__(self):
-        return f"<Favorite {self.user_id}, {self.breed_name}>"
\ No newline at end of file
+        return f"<Favorite {self.user_id}, {self.breed_name}>"
+
+
+class FavoriteCount(db.Model):
+    """How many users have favorited each breed.
+
+    Kept up to date as favorites are toggled and users deleted, so popularity
+    never needs a COUNT over the favorites table. reconcile() recomputes it
+    from scratch in case it drifts.
+    """
+
+    __tablename__ = 'favorite_counts'
+
+    breed_name = db.Column(
+        db.Text,
+        primary_key=True
+    )
+
+    count = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0
+    )
+
+    @classmethod
+    def adjust(cls, breed_name, delta):
+        """Add `delta` to the breed's count, creating the row if needed."""
+
+        cls.adjust_many({breed_name: delta})
+
+    @classmethod
+    def adjust_many(cls, deltas):
+        """Apply {breed_name: delta} to the counts in one statement."""
+
+        if not deltas:
+            return
+
+        # Sorted so concurrent transactions lock the rows in the same order.
+        added = sorted((name, delta) for name, delta in deltas.items() if delta > 0)
+        removed = sorted((name, delta) for name, delta in deltas.items() if delta < 0)
+        table = cls.__table__
+
+        if added:
+            stmt = insert(table).values([{'breed_name': name, 'count': delta} for name, delta in added])
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=[cls.breed_name],
+                set_={'count': table.c.count + stmt.excluded.count},
+            ))
+
+        if removed:
+            # Only ever lowers existing rows, and never below zero: favorites
+            # made before counts were kept have nothing to subtract from until
+            # `flask reconcile-favorite-counts` has been run.
+            changes = (values(column('breed_name', db.Text), column('delta', db.Integer), name='changes')
+                       .data(removed))
+            db.session.execute(table.update()
+                               .where(table.c.breed_name == changes.c.breed_name)
+                               .values(count=func.greatest(table.c.count + changes.c.delta, 0)))
+
+    @classmethod
+    def top(cls, n):
+        """The `n` most favorited breeds, as (breed_name, count) pairs."""
+
+        return (db.session.query(cls.breed_name, cls.count)
+                .filter(cls.count > 0)
+                .order_by(cls.count.desc(), cls.breed_name)
+                .limit(n)
+                .all())
+
+    @classmethod
+    def count_for(cls, breed_name):
+        row = cls.query.get(breed_name)
+        return row.count if row else 0
+
+    @classmethod
+    def reconcile(cls):
+        """Recompute every count from the favorites table.
+
+        Returns {breed_name: (stored, actual)} for each count that was wrong.
+        """
+
+        actual = dict(db.session.query(Favorite.breed_name, func.count())
+                      .group_by(Favorite.breed_name)
+                      .all())
+        stored = dict(db.session.query(cls.breed_name, cls.count).all())
+
+        drift = {name: (stored.get(name, 0), actual.get(name, 0))
+                 for name in set(actual) | set(stored)
+                 if stored.get(name, 0) != actual.get(name, 0)}
+
+        for name, (_, count) in drift.items():
+            stmt = insert(cls.__table__).values(breed_name=name, count=count)
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=[cls.breed_name],
+                set_={'count': stmt.excluded.count},
+            ))
+
+        return drift
+
+    def __repr__(self):
+        return f"<FavoriteCount {self.breed_name}: {self.count}>"
+
+
+class Recommendation(db.Model):
+    """A breed recommended to a user from the traits of their favorites.
+
+    Written by recommendations.py, for every user in batches and for one
+    user whenever their favorites change.
+    """
+
+    __tablename__ = 'recommendations'
+
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey('users.id', ondelete='cascade'),
+        primary_key=True
+    )
+
+    breed_name = db.Column(
+        db.Text,
+        primary_key=True
+    )
+
+    score = db.Column(
+        db.Float,
+        nullable=False
+    )
+
+    @classmethod
+    def replace_for(cls, recommendations):
+        """Replace the stored recommendations of each user in {user_id: [(breed_name, score), ...]}."""
+
+        if not recommendations:
+            return
+
+        table = cls.__table__
+        db.session.execute(table.delete().where(table.c.user_id.in_(list(recommendations))))
+
+        rows = [{'user_id': user_id, 'breed_name': name, 'score': score}
+                for user_id, recs in recommendations.items()
+                for name, score in recs]
+        if rows:
+            db.session.execute(table.insert(), rows)
+
+    @classmethod
+    def for_user(cls, user_id, limit=6):
+        """The user's recommended breed names, best first."""
+
+        return [name for (name,) in (db.session.query(cls.breed_name)
+                                     .filter(cls.user_id == user_id)
+                                     .order_by(cls.score.desc(), cls.breed_name)
+                                     .limit(limit))]
+
+    def __repr__(self):
+        return f"<Recommendation {self.user_id}, {self.breed_name}: {self.score}>"
+
+
+@event.listens_for(db.session, 'before_flush')
+def decrement_favorite_counts(session, flush_context, instances):
+    """Take deleted users' favorites off the counts.
+
+    Runs before the flush deletes the favorites themselves, in the same
+    transaction.
+    """
+
+    user_ids = [obj.id for obj in session.deleted if isinstance(obj, User)]
+    if not user_ids:
+        return
+
+    counts = FavoriteCount.__table__
+    favorites = Favorite.__table__
+
+    removed = (db.select(favorites.c.breed_name, func.count().label('n'))
+               .where(favorites.c.user_id.in_(user_ids))
+               .group_by(favorites.c.breed_name)
+               .subquery())
+
+    session.connection().execute(
+        counts.update()
+        .where(counts.c.breed_name == removed.c.breed_name)
+        .values(count=counts.c.count - removed.c.n)
+    )
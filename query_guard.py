@@ -0,0 +1,90 @@
+"""Counting database queries, for query budgets in tests and N+1 warnings in development."""
+
+import threading
+import traceback
+from collections import Counter
+from contextlib import ContextDecorator
+
+from flask import g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryBudgetExceeded(AssertionError):
+    """More queries were made than the budget allows."""
+
+
+class QueryCounter(ContextDecorator):
+    """Records the SQL statements run by this thread while a block or function runs.
+
+        with QueryCounter(max_queries=2) as queries:
+            client.get('/users/1')
+        queries.count, queries.statements
+
+    With `max_queries` set, QueryBudgetExceeded is raised on the way out if the
+    budget was overspent, listing every statement that ran.
+    """
+
+    def __init__(self, max_queries=None):
+        self.max_queries = max_queries
+        self.statements = []
+        self._thread = None
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def __enter__(self):
+        self.statements = []
+        self._thread = threading.get_ident()
+        event.listen(Engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        event.remove(Engine, 'before_cursor_execute', self._record)
+
+        if exc_type is None and self.max_queries is not None and self.count > self.max_queries:
+            listing = '\n'.join(f"  {n}. {statement}" for n, statement in enumerate(self.statements, 1))
+            raise QueryBudgetExceeded(f"{self.count} queries were made, the budget is {self.max_queries}:\n{listing}")
+
+        return False
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == self._thread:
+            self.statements.append(statement)
+
+
+def count_queries():
+    """Count the queries a block or function makes, without a limit."""
+
+    return QueryCounter()
+
+
+def query_budget(max_queries):
+    """Fail if the block or function makes more than `max_queries` queries."""
+
+    return QueryCounter(max_queries)
+
+
+def watch_for_repeated_queries(app, threshold=3):
+    """In debug mode, log any statement run `threshold` times within one request.
+
+    The same SQL over and over, only with different parameters, is usually
+    a lazy relationship being loaded in a loop. The log includes a stack trace
+    of where the repeat was made from.
+    """
+
+    @app.before_request
+    def start_watching():
+        if app.debug:
+            g.statements_seen = Counter()
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def check_for_repeat(conn, cursor, statement, parameters, context, executemany):
+        if not has_request_context() or 'statements_seen' not in g:
+            return
+
+        g.statements_seen[statement] += 1
+        if g.statements_seen[statement] == threshold:
+            app.logger.warning("Possible N+1: this statement has run %d times in this request:\n%s\n%s",
+                               threshold, statement, ''.join(traceback.format_stack()))
@@ -0,0 +1,93 @@
+"""Breed recommendations from the traits of the breeds each user has favorited."""
+
+import numpy as np
+
+from models import db, Favorite, Recommendation, User
+from similarity import top_k, trait_matrix
+
+
+class TasteModel:
+    """Trait vectors for one version of the catalog, built with BreedCatalog.derive().
+
+    A user's taste is the average of their favorite breeds' vectors, and
+    every breed is scored against it; for a batch of users that's one
+    matrix product.
+    """
+
+    def __init__(self, index):
+        self.version = index.version
+        self.names = [breed['name'] for breed in index.breeds]
+        self.positions = {name: i for i, name in enumerate(self.names)}
+
+        matrix = trait_matrix(index.breeds)
+        if len(matrix):
+            matrix = matrix - matrix.mean(axis=0)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.vectors = np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+    def recommend(self, favorites, n=6):
+        """Turn {user_id: [favorite breed names]} into {user_id: [(breed_name, score), ...]}.
+
+        Breeds a user has already favorited are never recommended to them,
+        and users without favorites get no recommendations.
+        """
+
+        user_ids = list(favorites)
+        liked = np.zeros((len(user_ids), len(self.names)))
+        for row, user_id in enumerate(user_ids):
+            for name in favorites[user_id]:
+                if name in self.positions:
+                    liked[row, self.positions[name]] = 1
+
+        counts = liked.sum(axis=1, keepdims=True)
+        tastes = np.divide(liked @ self.vectors, counts, out=np.zeros((len(user_ids), self.vectors.shape[1])),
+                           where=counts > 0)
+        scores = tastes @ self.vectors.T
+        scores[liked > 0] = -np.inf
+        best = top_k(scores, n)
+
+        return {
+            user_id: [(self.names[j], round(float(scores[row, j]), 4))
+                      for j in best[row] if np.isfinite(scores[row, j])] if counts[row, 0] else []
+            for row, user_id in enumerate(user_ids)
+        }
+
+
+def recompute_for(model, user_ids, n=6):
+    """Recompute and store recommendations for `user_ids`. The caller commits."""
+
+    favorites = {user_id: [] for user_id in user_ids}
+    rows = (db.session.query(Favorite.user_id, Favorite.breed_name)
+            .filter(Favorite.user_id.in_(user_ids)))
+    for user_id, breed_name in rows:
+        favorites[user_id].append(breed_name)
+
+    recommendations = model.recommend(favorites, n)
+    Recommendation.replace_for(recommendations)
+    return recommendations
+
+
+def recompute_all(model, chunk_size=500, n=6):
+    """Recompute every user's recommendations, `chunk_size` users at a time.
+
+    Users are read in id order a chunk at a time and each chunk is committed
+    before the next is read, so memory use doesn't grow with the number of
+    users. Returns how many users were processed.
+    """
+
+    after = 0
+    total = 0
+
+    while True:
+        user_ids = [user_id for (user_id,) in (db.session.query(User.id)
+                                               .filter(User.id > after)
+                                               .order_by(User.id)
+                                               .limit(chunk_size))]
+        if not user_ids:
+            return total
+
+        recompute_for(model, user_ids, n)
+        db.session.commit()
+
+        after = user_ids[-1]
+        total += len(user_ids)
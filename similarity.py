@@ -0,0 +1,91 @@
+"""Precomputed "breeds like this one", from the breeds' trait scores."""
+
+import numpy as np
+
+# Scored 1 to 5.
+SCALE_TRAITS = (
+    'adaptability', 'affection_level', 'child_friendly', 'dog_friendly', 'energy_level',
+    'grooming', 'health_issues', 'intelligence', 'shedding_level', 'social_needs',
+    'stranger_friendly', 'vocalisation',
+)
+# 0 or 1.
+FLAG_TRAITS = ('hypoallergenic', 'hairless', 'rex', 'short_legs', 'suppressed_tail', 'lap', 'indoor')
+
+TRAITS = SCALE_TRAITS + FLAG_TRAITS
+METRICS = ('cosine', 'euclidean')
+
+
+def trait_matrix(breeds):
+    """breeds x TRAITS matrix with every column scaled to 0..1.
+
+    A breed missing a trait gets the average of the breeds that have it.
+    """
+
+    matrix = np.array([[breed.get(trait) for trait in TRAITS] for breed in breeds], dtype=float)
+    if not len(breeds):
+        return matrix.reshape(0, len(TRAITS))
+
+    missing = np.isnan(matrix)
+    counts = (~missing).sum(axis=0)
+    means = np.divide(np.nansum(matrix, axis=0), counts, out=np.zeros(len(TRAITS)), where=counts > 0)
+    matrix[missing] = np.take(means, np.nonzero(missing)[1])
+
+    low = np.array([1.0] * len(SCALE_TRAITS) + [0.0] * len(FLAG_TRAITS))
+    high = np.array([5.0] * len(SCALE_TRAITS) + [1.0] * len(FLAG_TRAITS))
+    return np.clip((matrix - low) / (high - low), 0, 1)
+
+
+def top_k(scores, k):
+    """Column indices of the `k` highest scores in each row, highest first."""
+
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=int)
+
+    best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, best, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(best, order, axis=1)
+
+
+class SimilarBreeds:
+    """Each breed's `k` nearest neighbours by trait, for one version of the catalog.
+
+    Built with BreedCatalog.derive(): all the vector maths happens once, here,
+    so a lookup is just returning a precomputed tuple.
+    """
+
+    def __init__(self, index, k=6):
+        self.version = index.version
+        self.k = k
+        self.matrix = trait_matrix(index.breeds)
+        self.neighbours = {metric: {} for metric in METRICS}
+
+        n = len(index.breeds)
+        if n < 2:
+            return
+
+        # Cosine similarity of the trait vectors, centred so that a breed
+        # that's average at everything isn't "similar" to every other.
+        centred = self.matrix - self.matrix.mean(axis=0)
+        norms = np.linalg.norm(centred, axis=1, keepdims=True)
+        unit = np.divide(centred, norms, out=np.zeros_like(centred), where=norms > 0)
+        cosine = unit @ unit.T
+
+        # Euclidean distance, as a similarity from 1 (identical) to 0 (as
+        # far apart as the scales allow).
+        squared = (self.matrix ** 2).sum(axis=1)
+        distances = np.sqrt(np.maximum(squared[:, None] + squared[None, :] - 2 * self.matrix @ self.matrix.T, 0))
+        euclidean = 1 - distances / np.sqrt(len(TRAITS))
+
+        for metric, scores in (('cosine', cosine), ('euclidean', euclidean)):
+            np.fill_diagonal(scores, -np.inf)
+            # A breed is never its own neighbour, however small the catalog.
+            best = top_k(scores, min(k, n - 1))
+            for i, breed in enumerate(index.breeds):
+                self.neighbours[metric][breed['id']] = tuple(
+                    (index.breeds[j], round(float(scores[i, j]), 4)) for j in best[i])
+
+    def similar_to(self, breed_id, metric='cosine', limit=None):
+        """(breed, similarity) pairs for the breeds most like `breed_id`, most similar first."""
+
+        return self.neighbours[metric].get(breed_id, ())[:limit]
@@ -1,33 +1,163 @@
-BASE_URL = "https://springboard-ivy-capstone-1.herokuapp.com/api"
+BASE_URL = "/api"
 
 
 //////////////////////////////////////////////////////////////////////////////
 // index route
 
-const filterCats = async (e) => {
-    e.preventDefault()
-    let energyLevel = $('#energy-level option:selected').val()
-    let intelligence = $('#intelligence option:selected').val()
-    let socialNeeds = $('#social-needs option:selected').val()
-
-    $('div.cat-grid').show()
-    
-    if (energyLevel != "--Select a level--") {
-        $(`div.cat-grid[data-energy-level!=${energyLevel}]`).hide()
+const NO_IMAGE_URL = "https://westsiderc.org/wp-content/uploads/2019/08/Image-Not-Available.png"
+
+const catCard = (breed) => {
+    const $img = $('<img class="cat-img-thumbnail">')
+        .attr('src', breed.image_url || NO_IMAGE_URL)
+        .attr('alt', breed.image_url ? `Image of ${breed.name}` : 'Image not available')
+
+    return $('<div class="col-2 cat-grid">').append(
+        $('<a>').attr('href', `/cats/${breed.id}`).append(
+            $('<figure>').append($img, $('<figcaption>').text(breed.name))
+        )
+    )
+}
+
+const catFilters = () => {
+    const filters = {
+        energy_level : $('#energy-level').val(),
+        intelligence : $('#intelligence').val(),
+        social_needs : $('#social-needs').val(),
     }
-    if (intelligence != "--Select a level--") {
-        $(`div.cat-grid[data-intelligence!=${intelligence}]`).hide()
+    if ($('#hypoallergenic').prop("checked")) {
+        filters.hypoallergenic = 1
     }
-    if (socialNeeds != "--Select a level--") {
-        $(`div.cat-grid[data-social-needs!=${socialNeeds}]`).hide()
+    return filters
+}
+
+const showCats = async (page, append) => {
+    const res = await axios({
+        url    : `${BASE_URL}/breeds`,
+        method : 'GET',
+        params : {...catFilters(), page : page}
+    })
+
+    if (!append) {
+        $('#cat-grid-row').empty()
     }
-    if ($('#hypoallergenic').prop("checked")) {
-        $(`div.cat-grid[data-hypoallergenic=0]`).hide()
+    $('#cat-grid-row').append(res.data.breeds.map(catCard))
+
+    $('#no-cats-found').prop('hidden', res.data.total > 0)
+    $('#show-more-cats')
+        .data('next-page', page + 1)
+        .prop('hidden', page >= res.data.pages)
+}
+
+const filterCats = async (e) => {
+    e.preventDefault()
+    await showCats(1, false)
+}
+
+const showMoreCats = async (e) => {
+    e.preventDefault()
+    await showCats($('#show-more-cats').data('next-page'), true)
+}
+
+const showMostLoved = async () => {
+    const res = await axios({
+        url    : `${BASE_URL}/breeds/popular`,
+        method : 'GET',
+        params : {limit : 6}
+    })
+
+    if (res.data.breeds.length) {
+        $('#most-loved-row').append(res.data.breeds.map(catCard))
+        $('#most-loved').prop('hidden', false)
     }
+}
+
+let searchTimer = null
+
+const showSearchResults = async () => {
+    const query = $('#breed-search').val().trim()
+    if (!query) {
+        $('#breed-search-results').empty()
+        return
+    }
+
+    const res = await axios({
+        url    : `${BASE_URL}/breeds/search`,
+        method : 'GET',
+        params : {q : query, limit : 8}
+    })
+
+    // A newer query may have been typed while this one was in flight.
+    if ($('#breed-search').val().trim() !== query) {
         return
+    }
+
+    $('#breed-search-results').empty().append(res.data.results.map((breed) =>
+        $('<a class="list-group-item list-group-item-action">')
+            .attr('href', `/cats/${breed.id}`)
+            .text(breed.name)
+    ))
 }
 
+const searchBreeds = () => {
+    clearTimeout(searchTimer)
+    searchTimer = setTimeout(showSearchResults, 100)
+}
+
+$('#breed-search').on('input', searchBreeds)
 $('#filter-cats-form').on('submit', filterCats)
+$('#show-more-cats').on('click', showMoreCats)
+
+if ($('#most-loved').length) {
+    showMostLoved()
+}
+
+
+//////////////////////////////////////////////////////////////////////////////
+// Favorites, used by the breed_info and show_user_profile routes
+
+// Changes wait briefly before being sent so that rapid clicks go out as a
+// single request. Only the last change to each breed is sent.
+const pendingFavorites = new Map()
+let favoritesTimer = null
+
+const takePendingFavorites = () => {
+    clearTimeout(favoritesTimer)
+    const ops = Array.from(pendingFavorites, ([breedName, op]) => ({op : op, breed_name : breedName}))
+    pendingFavorites.clear()
+    return ops
+}
+
+const sendFavorites = async () => {
+    const ops = takePendingFavorites()
+    if (!ops.length) {
+        return
+    }
+
+    await axios({
+        url    : `${BASE_URL}/favorites/batch`,
+        method : 'POST',
+        data   : {ops : ops}
+    })
+
+    if ($('#favorite-count').length) {
+        showFavoriteCount()
+    }
+}
+
+const queueFavorite = (breedName, op) => {
+    pendingFavorites.set(breedName, op)
+    clearTimeout(favoritesTimer)
+    favoritesTimer = setTimeout(sendFavorites, 400)
+}
+
+// Send anything still waiting if the user leaves the page.
+window.addEventListener('pagehide', () => {
+    const ops = takePendingFavorites()
+    if (ops.length) {
+        navigator.sendBeacon(`${BASE_URL}/favorites/batch`,
+                             new Blob([JSON.stringify({ops : ops})], {type : 'application/json'}))
+    }
+})
 
 
 //////////////////////////////////////////////////////////////////////////////
@@ -47,7 +177,7 @@ $(".carousel-control-prev").click(() => {
     $("#image-carousel").carousel("prev")
 })
 
-const toggleFavoriteCat = async (e) => {
+const toggleFavoriteCat = (e) => {
     const breedName = e.target.dataset.breed
 
     if (e.target.dataset.user == "None") {
@@ -56,37 +186,35 @@ const toggleFavoriteCat = async (e) => {
     }
 
     else {
-        const res = await axios({
-            url    : `${BASE_URL}/togglefav`,
-            method : 'POST',
-            data   : {breed_name : breedName}
-        })
-
-        if (res.status == 201) {
-            $('.fa-star').addClass('favorited')
-        }
-
-        else {
-            $('.fa-star').removeClass('favorited')
-        }
+        $('.fa-star').toggleClass('favorited')
+        queueFavorite(breedName, $('.fa-star').hasClass('favorited') ? 'add' : 'remove')
     }
 }
 
+const showFavoriteCount = async () => {
+    const breedId = $('#favorite-count').data('breed-id')
+    const res = await axios({
+        url    : `${BASE_URL}/breeds/${breedId}/popularity`,
+        method : 'GET'
+    })
+
+    const count = res.data.favorites
+    $('#favorite-count').text(count == 1 ? 'Favorited by 1 user' : `Favorited by ${count} users`)
+}
+
 $('.fa-star').on('click', toggleFavoriteCat)
 
+if ($('#favorite-count').length) {
+    showFavoriteCount()
+}
+
 
 //////////////////////////////////////////////////////////////////////////////
 // show_user_profile route
 
-const removeFavoriteCat = async (e) => {
-    const breedName = e.target.dataset.breed
+const removeFavoriteCat = (e) => {
+    queueFavorite(e.target.dataset.breed, 'remove')
 
-    await axios({
-        url    : `${BASE_URL}/togglefav`,
-        method : 'POST',
-        data   : {breed_name : breedName}
-    })
-    
     e.target.parentElement.parentElement.nextElementSibling.remove()
     e.target.parentElement.parentElement.remove()
 }
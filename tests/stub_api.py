@@ -0,0 +1,128 @@
+"""A local stand-in for The Cat API, used by the tests.
+
+Serves the recorded breed catalog in fixtures/breeds.json at /v1/breeds and
+makes up image search results at /v1/images/search.
+"""
+
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def load_breeds():
+    """Return the recorded /breeds payload."""
+
+    with open(os.path.join(FIXTURES, 'breeds.json')) as f:
+        return json.load(f)
+
+
+class StubCatAPI:
+    """HTTP server on localhost answering like The Cat API.
+
+    `latency` seconds are added to every response. `fail_next(n)` makes the
+    next n requests answer with an error status instead.
+    """
+
+    def __init__(self, breeds=None, latency=0.0):
+        self.breeds = load_breeds() if breeds is None else breeds
+        self.latency = latency
+        self.requests = []
+        self._failures = []
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def fail_next(self, count=1, status=500):
+        with self._lock:
+            self._failures.extend([status] * count)
+
+    def reset(self):
+        with self._lock:
+            self.requests.clear()
+            self._failures.clear()
+        self.latency = 0.0
+
+    def count(self, path):
+        """How many requests were made to `path`, e.g. '/breeds'."""
+
+        return sum(1 for (p, _, _) in self.requests if p == path)
+
+    def handle(self, handler):
+        url = urlparse(handler.path)
+        path = url.path[len('/v1'):] if url.path.startswith('/v1') else url.path
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+        with self._lock:
+            self.requests.append((path, params, handler.headers.get('x-api-key')))
+            status = self._failures.pop(0) if self._failures else None
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if status:
+            return self.send_json(handler, {'message': 'stub failure'}, status)
+
+        if path == '/breeds':
+            return self.send_json(handler, self.breeds)
+
+        if path == '/images/search':
+            return self.send_json(handler, self.search_images(params))
+
+        self.send_json(handler, {'message': 'not found'}, 404)
+
+    def search_images(self, params):
+        breed_id = params.get('breed_ids', '')
+        limit = int(params.get('limit', 1))
+        return [{'id': f'{breed_id}{i}',
+                 'url': f'https://cdn2.thecatapi.com/images/{breed_id}{i}.jpg',
+                 'width': 1200,
+                 'height': 800}
+                for i in range(limit)]
+
+    def send_json(self, handler, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+_shared = None
+
+
+def shared_stub():
+    """The stub every view test points the app at, started on first use."""
+
+    global _shared
+    if _shared is None:
+        _shared = StubCatAPI().start()
+    return _shared
@@ -0,0 +1,92 @@
+"""Static asset fingerprinting and response compression tests."""
+
+import gzip
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from flask import Flask, make_response
+
+from assets import AssetManifest, build, fingerprint
+from compression import compress_response
+
+
+class AssetBuildTestCase(TestCase):
+    """Test building fingerprinted assets."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = self.tmp.name
+        with open(os.path.join(self.folder, 'app.js'), 'w') as f:
+            f.write("console.log('cats');\n" * 100)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_fingerprint(self):
+        """The name changes with the content and keeps its extension."""
+        self.assertRegex(fingerprint('app.js', b'a'), r'^app\.[0-9a-f]{8}\.js$')
+        self.assertNotEqual(fingerprint('app.js', b'a'), fingerprint('app.js', b'b'))
+
+    def test_build(self):
+        """Building writes a hashed copy, a gzipped copy and a manifest."""
+        manifest = build(self.folder, names=('app.js',))
+        path = os.path.join(self.folder, manifest['app.js'])
+
+        with open(os.path.join(self.folder, 'app.js'), 'rb') as f:
+            original = f.read()
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), original)
+        with open(path + '.gz', 'rb') as f:
+            self.assertEqual(gzip.decompress(f.read()), original)
+        with open(os.path.join(self.folder, 'dist', 'manifest.json')) as f:
+            self.assertEqual(json.load(f), manifest)
+
+    def test_manifest_urls(self):
+        """Templates get the fingerprinted URL once built, and the plain one before."""
+        app = Flask(__name__, static_folder=self.folder, static_url_path='/static')
+
+        with app.test_request_context():
+            unbuilt = AssetManifest(self.folder)
+            self.assertEqual(unbuilt.url('app.js'), '/static/app.js')
+            self.assertIsNone(unbuilt.version)
+
+            manifest = build(self.folder, names=('app.js',))
+            built = AssetManifest(self.folder)
+            self.assertEqual(built.url('app.js'), f"/static/{manifest['app.js']}")
+            self.assertTrue(built.is_fingerprinted(manifest['app.js']))
+            self.assertIsNotNone(built.version)
+
+
+class CompressionTestCase(TestCase):
+    """Test compressing responses."""
+
+    def setUp(self):
+        self.app = Flask(__name__)
+
+    def compressed(self, body, accept='gzip', mimetype='text/html'):
+        with self.app.test_request_context(headers={'Accept-Encoding': accept}):
+            response = make_response(body)
+            response.mimetype = mimetype
+            response.set_etag('abc')
+            return compress_response(response, min_size=500)
+
+    def test_gzip(self):
+        """Large HTML is gzipped and its ETag marked as such."""
+        body = '<p>cat</p>' * 200
+        response = self.compressed(body)
+
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.get_data()).decode(), body)
+        self.assertEqual(response.get_etag(), ('abc-gzip', False))
+        self.assertIn('Accept-Encoding', response.vary)
+
+    def test_skipped(self):
+        """Small bodies, images and clients that don't accept gzip are sent as is."""
+        self.assertNotIn('Content-Encoding', self.compressed('<p>cat</p>').headers)
+        self.assertNotIn('Content-Encoding', self.compressed('x' * 2000, mimetype='image/png').headers)
+
+        response = self.compressed('<p>cat</p>' * 200, accept='identity')
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertIn('Accept-Encoding', response.vary)
@@ -0,0 +1,50 @@
+"""Trait bitmap index tests."""
+
+from unittest import TestCase
+
+from breed_filter import TraitBitmaps
+from catalog import BreedIndex
+from stub_api import load_breeds
+
+
+class TraitBitmapsTestCase(TestCase):
+    """Test filtering breeds with the trait bitmaps."""
+
+    def setUp(self):
+        self.breeds = load_breeds()
+        self.bitmaps = TraitBitmaps(BreedIndex(self.breeds, version=1))
+
+    def expected(self, **levels):
+        return [b['id'] for b in self.breeds
+                if all(b[trait] == level for trait, level in levels.items())]
+
+    def test_no_filters_returns_everything(self):
+        """With no filters every breed matches, in catalog order."""
+        breeds, total = self.bitmaps.page({}, 1, 100)
+
+        self.assertEqual(total, len(self.breeds))
+        self.assertEqual([b['id'] for b in breeds], [b['id'] for b in self.breeds])
+
+    def test_filters_are_combined(self):
+        """Every requested trait level has to match."""
+        levels = {'energy_level': 5, 'hypoallergenic': 1}
+        breeds, total = self.bitmaps.page(levels, 1, 100)
+
+        self.assertEqual([b['id'] for b in breeds], self.expected(**levels))
+        self.assertEqual(total, len(breeds))
+        self.assertTrue(breeds)
+
+    def test_unknown_level_matches_nothing(self):
+        """A level no breed has gives an empty result."""
+        self.assertEqual(self.bitmaps.page({'intelligence': 9}), ([], 0))
+
+    def test_pagination(self):
+        """Pages partition the matches without overlap."""
+        levels = {'energy_level': 5}
+        first, total = self.bitmaps.page(levels, 1, 3)
+        second, _ = self.bitmaps.page(levels, 2, 3)
+        rest, _ = self.bitmaps.page(levels, 3, 3)
+
+        self.assertEqual(len(first), 3)
+        self.assertEqual([b['id'] for b in first + second + rest], self.expected(**levels))
+        self.assertEqual(total, len(self.expected(**levels)))
@@ -0,0 +1,51 @@
+"""Breed search index tests."""
+
+from unittest import TestCase
+
+from breed_search import BreedSearch, normalize
+from catalog import BreedIndex
+from stub_api import load_breeds
+
+
+class BreedSearchTestCase(TestCase):
+    """Test searching breeds by name, alternate name and origin."""
+
+    def setUp(self):
+        self.search = BreedSearch(BreedIndex(load_breeds(), version=1))
+
+    def ids(self, query, limit=10):
+        return [breed['id'] for breed, match in self.search.search(query, limit)]
+
+    def test_normalize(self):
+        """Case, accents and punctuation are ignored."""
+        self.assertEqual(normalize("  Égypt-ian  MAU "), "egypt ian mau")
+
+    def test_name_prefix(self):
+        """Names starting with the query come first, in name order."""
+        self.assertEqual(self.ids("a")[:3], ['abys', 'aege', 'abob'])
+        self.assertEqual(self.ids("Brit"), ['bsho'])
+
+    def test_word_and_alt_name_prefix(self):
+        """Later words of a name and alternate names match too, ranked after names."""
+        self.assertEqual(self.ids("shorthair"), ['bsho'])
+        self.assertEqual(self.ids("siames"), ['siam', 'bali'])
+        self.assertEqual(self.search.search("thai")[0][1], 'alt_name')
+
+    def test_origin(self):
+        """Breeds can be found by where they come from."""
+        self.assertIn('emau', self.ids("egypt"))
+        self.assertIn('abys', self.ids("egypt"))
+        self.assertEqual(self.ids("egypt")[0], 'emau')
+
+    def test_typos(self):
+        """Queries that prefix nothing fall back to similar spellings."""
+        results = self.search.search("abysinian")
+
+        self.assertEqual(results[0][0]['id'], 'abys')
+        self.assertEqual(results[0][1], 'fuzzy')
+        self.assertEqual(self.ids("xyzzy"), [])
+
+    def test_limit(self):
+        """No more than `limit` results are returned."""
+        self.assertEqual(len(self.ids("united", limit=2)), 2)
+        self.assertEqual(self.ids(""), [])
@@ -1,13 +1,21 @@
 """Breed View tests."""
 
 import os
+import re
+import time
 from unittest import TestCase
 
-from models import db, User, Favorite
+from models import db, User, Favorite, FavoriteCount
 
 os.environ['DATABASE_URL'] = "postgresql:///cat_finder_test"
+os.environ['BREED_SNAPSHOT_PATH'] = ''
 
-from app import app, CURR_USER_KEY
+from stub_api import shared_stub
+
+os.environ['CAT_API_BASE_URL'] = shared_stub().url
+
+import app as app_module
+from app import app, breed_catalog, image_cache, CURR_USER_KEY
 
 app.config['WTF_CSRF_ENABLED'] = False
 
@@ -73,6 +81,259 @@ class BreedViewTestCase(TestCase):
             self.assertEqual(resp.status_code, 200)
             self.assertIn('<span class="fa-solid fa-star favorited" data-breed=', html)
 
+    def test_slow_images_fall_back_to_no_carousel(self):
+        """If the image search misses its deadline the page renders without a carousel."""
+        breed_catalog.get_breeds()
+        image_cache.clear()
+        stub = shared_stub()
+        stub.latency = 0.5
+        app.config['IMAGE_SEARCH_DEADLINE'] = 0.05
+
+        try:
+            with self.client as c:
+                resp = c.get('/cats/abys')
+                html = resp.get_data(as_text=True)
+        finally:
+            stub.latency = 0
+            app.config['IMAGE_SEARCH_DEADLINE'] = 2
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("Temperament:", html)
+        self.assertNotIn('id="image-carousel"', html)
+
+    def test_cat_images_are_cached(self):
+        """A second view of a breed doesn't search for images again."""
+        image_cache.clear()
+        stub = shared_stub()
+        stub.reset()
+
+        with self.client as c:
+            c.get('/cats/abys')
+            resp = c.get('/cats/abys')
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('id="image-carousel"', resp.get_data(as_text=True))
+        self.assertEqual(stub.count('/images/search'), 1)
+
+    def test_breed_details_are_rendered_once(self):
+        """Breed details are rendered once per catalog version and shared by every visitor."""
+        from fragments import RenderedFragments
+
+        fragments = breed_catalog.derive(RenderedFragments)
+
+        with self.client as c:
+            c.get('/cats/aege')
+            misses = fragments.misses
+
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.uid1
+
+            resp = c.get('/cats/aege')
+            html = resp.get_data(as_text=True)
+
+        self.assertEqual(fragments.misses, misses)
+        self.assertGreaterEqual(fragments.hits, 1)
+        self.assertIn("Temperament:", html)
+        self.assertIn('data-breed="Aegean"', html)
+
+    def test_filter_breeds_api(self):
+        """The breeds API returns the breeds matching every filter."""
+        with self.client as c:
+            resp = c.get('/api/breeds?energy_level=5&hypoallergenic=1&per_page=2')
+            data = resp.json
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(data['page'], 1)
+            self.assertEqual(len(data['breeds']), 2)
+            self.assertGreater(data['total'], 2)
+            for breed in data['breeds']:
+                self.assertEqual(breed['energy_level'], 5)
+                self.assertEqual(breed['hypoallergenic'], 1)
+
+            resp = c.get('/api/breeds?intelligence=abc')
+            self.assertEqual(resp.status_code, 400)
+
+    def test_search_breeds_api(self):
+        """The search API returns matching breeds, best first, with how they matched."""
+        with self.client as c:
+            resp = c.get('/api/breeds/search?q=brit')
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual([b['id'] for b in resp.json['results']], ['bsho'])
+            self.assertEqual(resp.json['results'][0]['match'], 'name')
+
+            resp = c.get('/api/breeds/search?q=united&limit=2')
+            self.assertEqual(len(resp.json['results']), 2)
+
+            resp = c.get('/api/breeds/search')
+            self.assertEqual(resp.json['results'], [])
+
+    def test_similar_breeds(self):
+        """The breed page shows similar breeds, which are also available as JSON."""
+        with self.client as c:
+            html = c.get('/cats/bsho').get_data(as_text=True)
+            self.assertIn("Breeds like this", html)
+
+            resp = c.get('/api/breeds/bsho/similar?limit=2')
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(len(resp.json['breeds']), 2)
+            self.assertIn(f'href="/cats/{resp.json["breeds"][0]["id"]}"', html)
+            self.assertGreaterEqual(resp.json['breeds'][0]['similarity'], resp.json['breeds'][1]['similarity'])
+
+            self.assertEqual(len(c.get('/api/breeds/bsho/similar?limit=-1').json['breeds']), 1)
+            self.assertEqual(len(c.get('/api/breeds/bsho/similar?limit=100').json['breeds']), 6)
+            self.assertEqual(c.get('/api/breeds/bsho/similar?metric=euclidean').status_code, 200)
+            self.assertEqual(c.get('/api/breeds/bsho/similar?metric=manhattan').status_code, 400)
+            self.assertEqual(c.get('/api/breeds/nope/similar').status_code, 404)
+
+    def test_toggle_favorite(self):
+        """Toggling a breed favorites it, and toggling it again removes it."""
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.uid1
+
+            resp = c.post('/api/togglefav', json={'breed_name': 'Bengal'})
+            self.assertEqual(resp.status_code, 201)
+            self.assertEqual(resp.json['fav'], {'user_id': self.uid1, 'breed_name': 'Bengal'})
+
+            resp = c.post('/api/togglefav', json={'breed_name': 'Bengal'})
+            self.assertEqual(resp.status_code, 200)
+            self.assertIsNone(Favorite.query.get((self.uid1, 'Bengal')))
+
+    def test_toggle_favorite_anon(self):
+        """Anonymous users can't favorite breeds."""
+        with self.client as c:
+            resp = c.post('/api/togglefav', json={'breed_name': 'Bengal'})
+
+            self.assertEqual(resp.status_code, 401)
+
+    def test_batch_favorites(self):
+        """A batch applies the last op for each breed in one request."""
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.uid1
+
+            resp = c.post('/api/favorites/batch', json={'ops': [
+                {'op': 'add', 'breed_name': 'Bengal'},
+                {'op': 'add', 'breed_name': 'Siamese'},
+                {'op': 'remove', 'breed_name': 'Siamese'},
+                {'op': 'remove', 'breed_name': 'Abyssinian'},
+                {'op': 'remove', 'breed_name': 'Persian'},
+            ]})
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(resp.json, {'added': ['Bengal'], 'removed': ['Abyssinian']})
+            self.assertEqual([f.breed_name for f in Favorite.query.filter_by(user_id=self.uid1)], ['Bengal'])
+            self.assertEqual(FavoriteCount.count_for('Bengal'), 1)
+
+    def test_batch_favorites_invalid(self):
+        """Malformed batches are rejected without changing anything."""
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.uid1
+
+            resp = c.post('/api/favorites/batch', json={'ops': [
+                {'op': 'add', 'breed_name': 'Bengal'},
+                {'op': 'toggle', 'breed_name': 'Siamese'},
+            ]})
+            self.assertEqual(resp.status_code, 400)
+
+            resp = c.post('/api/favorites/batch', json={'ops': 'Bengal'})
+            self.assertEqual(resp.status_code, 400)
+
+            resp = c.post('/api/favorites/batch', json=[1, 2])
+            self.assertEqual(resp.status_code, 400)
+
+            self.assertIsNone(Favorite.query.get((self.uid1, 'Bengal')))
+
+    def test_popular_breeds(self):
+        """The leaderboard and per-breed counts follow favorites."""
+        app_module._leaderboard = (0.0, [])
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.uid1
+
+            c.post('/api/togglefav', json={'breed_name': 'Bengal'})
+
+            resp = c.get('/api/breeds/popular?limit=3')
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual([(b['name'], b['favorites']) for b in resp.json['breeds']], [('Bengal', 1)])
+
+            resp = c.get('/api/breeds/beng/popularity')
+            self.assertEqual(resp.json, {'breed_name': 'Bengal', 'favorites': 1})
+
+            resp = c.get('/api/breeds/invalidbreed/popularity')
+            self.assertEqual(resp.status_code, 404)
+
+    def test_breed_page_revalidates_for_anonymous_users(self):
+        """Anonymous visitors get an ETag and a 304 when the page hasn't changed."""
+        with self.client as c:
+            resp = c.get('/cats/abys')
+            etag = resp.headers['ETag']
+
+            self.assertIn('public', resp.headers['Cache-Control'])
+            self.assertIn('no-cache', resp.headers['Cache-Control'])
+
+            resp = c.get('/cats/abys', headers={'If-None-Match': etag})
+            self.assertEqual(resp.status_code, 304)
+            self.assertEqual(resp.get_data(), b'')
+
+            resp = c.get('/cats/aege', headers={'If-None-Match': etag})
+            self.assertEqual(resp.status_code, 200)
+
+    def test_breed_page_etag_follows_images(self):
+        """Refetched images give the page a new ETag, and a 304 still counts as a view."""
+        image_cache.clear()
+
+        with self.client as c:
+            etag = c.get('/cats/abys').headers['ETag']
+            views = image_cache.views['abys']
+
+            resp = c.get('/cats/abys', headers={'If-None-Match': etag})
+            self.assertEqual(resp.status_code, 304)
+            self.assertEqual(image_cache.views['abys'], views + 1)
+
+            image_cache.put('abys', 5, [{'id': 'new', 'url': 'https://example.com/new.jpg'}])
+            resp = c.get('/cats/abys', headers={'If-None-Match': etag})
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp.headers['ETag'], etag)
+        self.assertIn('https://example.com/new.jpg', resp.get_data(as_text=True))
+
+    def test_index_revalidates_for_anonymous_users(self):
+        """The home page is also answered with a 304 when unchanged."""
+        with self.client as c:
+            etag = c.get('/').headers['ETag']
+            resp = c.get('/', headers={'If-None-Match': etag})
+
+            self.assertEqual(resp.status_code, 304)
+
+    def test_compressed_index_revalidates(self):
+        """The gzipped home page has its own ETag, which still gets a 304."""
+        with self.client as c:
+            resp = c.get('/', headers={'Accept-Encoding': 'gzip'})
+            etag = resp.headers['ETag']
+
+            self.assertEqual(resp.headers['Content-Encoding'], 'gzip')
+            self.assertTrue(etag.endswith('-gzip"'))
+
+            resp = c.get('/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+            self.assertEqual(resp.status_code, 304)
+            self.assertEqual(resp.headers['ETag'], etag)
+
+    def test_personalized_pages_are_private(self):
+        """Pages for logged in users are neither shared nor revalidated."""
+        with self.client as c:
+            etag = c.get('/cats/abys').headers['ETag']
+
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.uid1
+
+            resp = c.get('/cats/abys', headers={'If-None-Match': etag})
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertNotIn('ETag', resp.headers)
+            self.assertEqual(resp.headers['Cache-Control'], 'private, no-store')
+
     def test_invalid_cat(self):
         """If a breed is invalid, return an error page."""
         with self.client as c:
@@ -86,13 +347,49 @@ class BreedViewTestCase(TestCase):
             self.assertIn("Sorry, but we don't currently have information on that cat breed.", html)
 
     def test_random_cat_generator(self):
-        """The random cat generator redirects to a breed's information page."""
+        """The random cat generator shows a breed's information page without redirecting."""
         with self.client as c:
             resp = c.get('/random')
-            self.assertEqual(resp.status_code, 302)
-            
-            resp_redirect = c.get('/random', follow_redirects=True)
-            html = resp_redirect.get_data(as_text=True)
+            html = resp.get_data(as_text=True)
 
-            self.assertEqual(resp_redirect.status_code, 200)
+            self.assertEqual(resp.status_code, 200)
             self.assertIn("Temperament:", html)
+            self.assertEqual(resp.headers['Cache-Control'], 'private, no-store')
+
+    def test_random_cat_does_not_repeat(self):
+        """Every breed comes up once before any of them comes up again."""
+        index = breed_catalog.get_index()
+
+        with self.client as c:
+            shown = [shown_breed_id(c.get('/random')) for _ in range(len(index.ids) + 1)]
+
+        self.assertEqual(sorted(shown[:-1]), sorted(index.ids))
+        self.assertNotEqual(shown[-1], shown[-2])
+
+    def test_random_cat_prefetches_next_images(self):
+        """The next random breed's images are fetched ahead of time, so showing it needs no search."""
+        image_cache.clear()
+        stub = shared_stub()
+
+        with self.client as c:
+            c.get('/random')
+            with c.session_transaction() as sess:
+                seed, cursor, size = sess[app_module.RANDOM_CAT_KEY]
+            following = breed_catalog.get_index().ids[app_module.shuffled(seed, size)[cursor]]
+
+            deadline = time.monotonic() + 2
+            while not image_cache.is_fresh(following, 5) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertTrue(image_cache.is_fresh(following, 5))
+
+            searches = stub.count('/images/search')
+            resp = c.get('/random')
+
+        self.assertEqual(shown_breed_id(resp), following)
+        self.assertIn('id="image-carousel"', resp.get_data(as_text=True))
+        # Only the prefetch for the breed after that one.
+        self.assertLessEqual(stub.count('/images/search') - searches, 1)
+
+
+def shown_breed_id(resp):
+    return re.search(r'data-breed-id="([^"]+)"', resp.get_data(as_text=True)).group(1)
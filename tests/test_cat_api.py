@@ -0,0 +1,115 @@
+"""Cat API client tests, run against a local stub server."""
+
+from unittest import TestCase
+
+from cat_api import CatAPIClient, CatAPIError, CircuitBreaker, CircuitOpenError
+from stub_api import StubCatAPI
+
+
+class CatAPIClientTestCase(TestCase):
+    """Test the Cat API client."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.stub = StubCatAPI().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.stop()
+
+    def setUp(self):
+        self.stub.reset()
+        self.client = CatAPIClient(base_url=self.stub.url,
+                                   headers={"x-api-key": "test-key"},
+                                   backoff=0,
+                                   breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+
+    def test_get_breeds(self):
+        """The client returns the decoded catalog and sends the API key."""
+        breeds = self.client.get_breeds()
+
+        self.assertIn('Abyssinian', [b['name'] for b in breeds])
+        self.assertEqual(self.stub.requests[0][2], 'test-key')
+
+    def test_search_images(self):
+        """Image searches pass the breed and limit through."""
+        imgs = self.client.search_images('abys', limit=3)
+
+        self.assertEqual(len(imgs), 3)
+        self.assertEqual(self.stub.requests[0][1], {'breed_ids': 'abys', 'limit': '3'})
+
+    def test_server_errors_are_retried(self):
+        """A 5xx is retried and the later success is returned."""
+        self.stub.fail_next(2, status=503)
+
+        breeds = self.client.get_breeds()
+
+        self.assertTrue(breeds)
+        self.assertEqual(self.stub.count('/breeds'), 3)
+
+    def test_attempts_are_observed(self):
+        """Every attempt is reported with its endpoint, status and duration."""
+        observed = []
+        self.client.observe = lambda *args: observed.append(args)
+        self.stub.fail_next(1, status=503)
+
+        self.client.search_images('abys')
+
+        self.assertEqual([(e, s) for (e, s, _) in observed],
+                         [('images/search', '503'), ('images/search', '200')])
+        self.assertTrue(all(seconds >= 0 for (_, _, seconds) in observed))
+
+    def test_retries_are_bounded(self):
+        """After the last retry the error reaches the caller."""
+        self.stub.fail_next(5, status=500)
+
+        with self.assertRaises(CatAPIError):
+            self.client.get_breeds()
+
+        self.assertEqual(self.stub.count('/breeds'), 3)
+
+    def test_client_errors_are_not_retried(self):
+        """A 4xx fails straight away without tripping the breaker."""
+        self.stub.fail_next(1, status=404)
+
+        with self.assertRaises(CatAPIError):
+            self.client.get_breeds()
+
+        self.assertEqual(self.stub.count('/breeds'), 1)
+        self.assertEqual(self.client.breaker.state, 'closed')
+
+    def test_timeouts(self):
+        """A slow upstream raises instead of hanging."""
+        self.stub.latency = 0.3
+        client = CatAPIClient(base_url=self.stub.url, retries=0,
+                              timeouts={'breeds': (1, 0.05)})
+
+        with self.assertRaises(CatAPIError):
+            client.get_breeds()
+
+    def test_circuit_opens_after_failures(self):
+        """Once the breaker opens, calls fail without reaching the upstream."""
+        self.stub.fail_next(6, status=500)
+
+        for _ in range(2):
+            with self.assertRaises(CatAPIError):
+                self.client.get_breeds()
+
+        with self.assertRaises(CircuitOpenError):
+            self.client.get_breeds()
+
+        self.assertEqual(self.stub.count('/breeds'), 6)
+        self.assertEqual(self.client.breaker.state, 'open')
+
+    def test_circuit_closes_after_successful_trial(self):
+        """A successful call in the half-open state closes the breaker."""
+        breaker = self.client.breaker
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.reset_timeout = 0
+
+        self.assertEqual(breaker.state, 'half-open')
+
+        self.client.get_breeds()
+
+        self.assertEqual(breaker.state, 'closed')
@@ -0,0 +1,217 @@
+"""Breed catalog cache tests."""
+
+import os
+import tempfile
+import threading
+import time
+from unittest import TestCase
+
+from catalog import BreedCatalog, BreedIndex, load_snapshot, save_snapshot
+
+
+class FakeFetch:
+    """Stands in for The Cat API, returning a new catalog on every call."""
+
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self):
+        self.release.wait(5)
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("upstream is down")
+        return [{"id": "abys", "name": "Abyssinian", "call": self.calls}]
+
+
+class BreedCatalogTestCase(TestCase):
+    """Test the breed catalog cache."""
+
+    def setUp(self):
+        self.fetch = FakeFetch()
+        self.catalog = BreedCatalog(self.fetch, ttl=60)
+
+    def wait_for_refresh(self):
+        for _ in range(100):
+            if not self.catalog._refreshing:
+                return
+            time.sleep(0.01)
+
+    def test_first_call_is_a_miss(self):
+        """A cold cache fetches the catalog once."""
+        breeds = self.catalog.get_breeds()
+
+        self.assertEqual(breeds[0]['name'], 'Abyssinian')
+        self.assertEqual(self.fetch.calls, 1)
+        self.assertEqual(self.catalog.misses, 1)
+        self.assertEqual(self.catalog.hits, 0)
+        self.assertEqual(self.catalog.version, 1)
+
+    def test_fresh_cache_is_a_hit(self):
+        """Calls within the TTL don't go upstream."""
+        self.catalog.get_breeds()
+        self.catalog.get_breeds()
+        self.catalog.get_breeds()
+
+        self.assertEqual(self.fetch.calls, 1)
+        self.assertEqual(self.catalog.hits, 2)
+        self.assertEqual(self.catalog.stats()['misses'], 1)
+
+    def test_stale_cache_is_served_while_refreshing(self):
+        """An expired catalog is returned immediately and only one refresh runs."""
+        first = self.catalog.get_breeds()
+        self.catalog.ttl = 0
+        self.fetch.release.clear()
+
+        self.assertIs(self.catalog.get_breeds(), first)
+        self.assertIs(self.catalog.get_breeds(), first)
+        self.assertEqual(self.catalog.stale_hits, 2)
+
+        self.fetch.release.set()
+        self.wait_for_refresh()
+
+        self.assertEqual(self.fetch.calls, 2)
+        self.assertEqual(self.catalog.version, 2)
+        self.assertEqual(self.catalog.get_breeds()[0]['call'], 2)
+
+    def test_failed_refresh_keeps_stale_copy(self):
+        """If the background refresh fails the old catalog is kept."""
+        first = self.catalog.get_breeds()
+        self.catalog.ttl = 0
+        self.fetch.fail = True
+
+        self.catalog.get_breeds()
+        self.wait_for_refresh()
+
+        self.assertIs(self.catalog.get_breeds(), first)
+        self.assertEqual(self.catalog.refresh_failures, 1)
+        self.assertEqual(self.catalog.version, 1)
+
+    def test_cold_cache_failure_raises(self):
+        """With nothing cached an upstream failure reaches the caller."""
+        self.fetch.fail = True
+
+        with self.assertRaises(ConnectionError):
+            self.catalog.get_breeds()
+
+
+class BreedIndexTestCase(TestCase):
+    """Test the breed lookup index."""
+
+    def setUp(self):
+        self.index = BreedIndex([
+            {"id": "abys", "name": "Abyssinian", "origin": "Egypt"},
+            {"id": "egyp", "name": "Egyptian Mau", "origin": "Egypt"},
+        ], version=3)
+
+    def test_lookup_by_id_and_name(self):
+        """Breeds can be found by their id or their name."""
+        self.assertEqual(self.index.by_id['egyp']['name'], 'Egyptian Mau')
+        self.assertEqual(self.index.by_name['Abyssinian']['id'], 'abys')
+        self.assertEqual(self.index.ids, ('abys', 'egyp'))
+        self.assertEqual(len(self.index), 2)
+
+    def test_lookup_only_matches_keys(self):
+        """Other field values, like an origin, are not treated as ids."""
+        self.assertIsNone(self.index.by_id.get('Egypt'))
+        self.assertIsNone(self.index.by_name.get('Egypt'))
+
+    def test_index_is_read_only(self):
+        """The lookup tables can't be modified."""
+        with self.assertRaises(TypeError):
+            self.index.by_id['new'] = {}
+
+    def test_index_is_built_once_per_version(self):
+        """The catalog hands out the same index until it is refreshed."""
+        catalog = BreedCatalog(FakeFetch(), ttl=60)
+        first = catalog.get_index()
+
+        self.assertIs(catalog.get_index(), first)
+
+        catalog.refresh()
+
+        self.assertIsNot(catalog.get_index(), first)
+        self.assertEqual(catalog.get_index().version, 2)
+
+    def test_derived_data_is_rebuilt_per_version(self):
+        """Data derived from the catalog is built once per version."""
+        catalog = BreedCatalog(FakeFetch(), ttl=60)
+        builds = []
+
+        def build(index):
+            builds.append(index.version)
+            return len(index)
+
+        self.assertEqual(catalog.derive(build), 1)
+        self.assertEqual(catalog.derive(build), 1)
+
+        catalog.refresh()
+        catalog.derive(build)
+
+        self.assertEqual(builds, [1, 2])
+
+
+class BreedSnapshotTestCase(TestCase):
+    """Test persisting the catalog to disk."""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'breeds.json')
+        self.fetch = FakeFetch()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_refresh_writes_snapshot(self):
+        """A fetched catalog is saved to disk."""
+        catalog = BreedCatalog(self.fetch, snapshot_path=self.path)
+        catalog.get_breeds()
+
+        snapshot = load_snapshot(self.path)
+
+        self.assertEqual(snapshot['breeds'][0]['name'], 'Abyssinian')
+        self.assertEqual(snapshot['digest'], catalog.get_index().digest)
+
+    def test_warm_start_from_snapshot(self):
+        """A new catalog starts from the snapshot without calling upstream."""
+        save_snapshot(self.path, [{"id": "beng", "name": "Bengal"}])
+        catalog = BreedCatalog(self.fetch, ttl=60, snapshot_path=self.path)
+
+        self.assertTrue(catalog.load_snapshot())
+        self.assertEqual(catalog.get_index().by_id['beng']['name'], 'Bengal')
+        self.assertEqual(self.fetch.calls, 0)
+
+    def test_old_snapshot_is_loaded_stale(self):
+        """An old snapshot is served, but refreshed in the background."""
+        save_snapshot(self.path, [{"id": "beng", "name": "Bengal"}], saved_at=time.time() - 120)
+        catalog = BreedCatalog(self.fetch, ttl=60, snapshot_path=self.path)
+        catalog.load_snapshot()
+
+        self.assertEqual(catalog.get_breeds()[0]['name'], 'Bengal')
+        self.assertEqual(catalog.stale_hits, 1)
+
+        for _ in range(100):
+            if self.fetch.calls and not catalog._refreshing:
+                break
+            time.sleep(0.01)
+
+        self.assertEqual(catalog.get_breeds()[0]['name'], 'Abyssinian')
+
+    def test_missing_or_unknown_snapshot_is_ignored(self):
+        """Without a usable snapshot the catalog starts cold."""
+        catalog = BreedCatalog(self.fetch, snapshot_path=self.path)
+        self.assertFalse(catalog.load_snapshot())
+
+        with open(self.path, 'w') as f:
+            f.write('{"format": 0, "breeds": []}')
+        self.assertFalse(catalog.load_snapshot())
+
+    def test_unchanged_catalog_keeps_its_version(self):
+        """Refreshing to identical contents doesn't start a new version."""
+        catalog = BreedCatalog(lambda: [{"id": "abys", "name": "Abyssinian"}])
+        catalog.refresh()
+        catalog.refresh()
+
+        self.assertEqual(catalog.version, 1)
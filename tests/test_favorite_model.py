@@ -1,10 +1,12 @@
 """Favorite model tests."""
 
 import os
+import threading
 from unittest import TestCase
-from models import db, User, Favorite
+from models import db, User, Favorite, FavoriteCount
 
 os.environ['DATABASE_URL'] = "postgresql:///cat_finder_test"
+os.environ['BREED_SNAPSHOT_PATH'] = ''
 
 from app import app
 
@@ -18,6 +20,7 @@ class FavoriteModelTestCase(TestCase):
 
         User.query.delete()
         Favorite.query.delete()
+        FavoriteCount.query.delete()
 
         u1 = User.signup(
             email="test1@test.com",
@@ -39,6 +42,9 @@ class FavoriteModelTestCase(TestCase):
         db.session.add(f1)
         db.session.commit()
 
+        FavoriteCount.reconcile()
+        db.session.commit()
+
         self.f1 = f1
 
         self.client = app.test_client()
@@ -64,3 +70,119 @@ class FavoriteModelTestCase(TestCase):
         f = self.f1
 
         self.assertEqual(str(f), f"<Favorite {self.uid1}, Abyssinian>")
+
+
+    def test_page_for(self):
+        """Favorites are paged in name order, each page starting after the last."""
+        Favorite.add_many(self.uid1, ['Bengal', 'Persian', 'Aegean', 'Siamese'])
+        db.session.commit()
+
+        names, after = Favorite.page_for(self.uid1, limit=2)
+        self.assertEqual(names, ['Abyssinian', 'Aegean'])
+        self.assertEqual(after, 'Aegean')
+
+        names, after = Favorite.page_for(self.uid1, after=after, limit=2)
+        self.assertEqual(names, ['Bengal', 'Persian'])
+
+        names, after = Favorite.page_for(self.uid1, after=after, limit=2)
+        self.assertEqual(names, ['Siamese'])
+        self.assertIsNone(after)
+
+    def test_toggle_removes_existing_favorite(self):
+        """Toggling a favorited breed unfavorites it."""
+        self.assertFalse(Favorite.toggle(self.uid1, 'Abyssinian'))
+        db.session.commit()
+
+        self.assertIsNone(Favorite.query.get((self.uid1, 'Abyssinian')))
+
+    def test_toggle_adds_new_favorite(self):
+        """Toggling a breed that isn't favorited favorites it."""
+        self.assertTrue(Favorite.toggle(self.uid1, 'Bengal'))
+        db.session.commit()
+
+        self.assertIsNotNone(Favorite.query.get((self.uid1, 'Bengal')))
+
+    def test_concurrent_toggles_do_not_conflict(self):
+        """Two overlapping toggles adding the same breed don't raise an IntegrityError."""
+        first_added = threading.Event()
+        errors = []
+
+        def toggle(signal=None):
+            try:
+                with app.app_context():
+                    Favorite.toggle(self.uid1, 'Bengal')
+                    if signal:
+                        signal.set()
+                        # Give the other toggle time to block on our uncommitted row.
+                        threading.Event().wait(0.2)
+                    db.session.commit()
+            except Exception as e:
+                errors.append(e)
+
+        first = threading.Thread(target=toggle, kwargs={'signal': first_added})
+        first.start()
+        first_added.wait(5)
+        second = threading.Thread(target=toggle)
+        second.start()
+        first.join(5)
+        second.join(5)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Favorite.query.filter_by(user_id=self.uid1, breed_name='Bengal').count(), 1)
+
+        self.assertEqual(FavoriteCount.count_for('Bengal'), 1)
+
+    def test_toggle_updates_counts(self):
+        """Favoriting and unfavoriting a breed moves its count."""
+        u2 = User.signup(email="test2@test.com", username="testuser2",
+                         password="HASHED_PASSWORD", image_url=None)
+        db.session.commit()
+
+        Favorite.toggle(self.uid1, 'Bengal')
+        Favorite.toggle(u2.id, 'Bengal')
+        Favorite.toggle(self.uid1, 'Abyssinian')
+        db.session.commit()
+
+        self.assertEqual(FavoriteCount.count_for('Bengal'), 2)
+        self.assertEqual(FavoriteCount.count_for('Abyssinian'), 0)
+        self.assertEqual(FavoriteCount.top(5), [('Bengal', 2)])
+
+    def test_counts_never_go_negative(self):
+        """Removing a favorite made before its breed was counted leaves the count at zero."""
+        FavoriteCount.query.delete()
+        db.session.commit()
+
+        Favorite.toggle(self.uid1, 'Abyssinian')
+        db.session.commit()
+
+        self.assertEqual(FavoriteCount.count_for('Abyssinian'), 0)
+        self.assertIsNone(FavoriteCount.query.get('Abyssinian'))
+
+        FavoriteCount.adjust('Bengal', 1)
+        FavoriteCount.adjust_many({'Bengal': -2})
+        db.session.commit()
+        self.assertEqual(FavoriteCount.count_for('Bengal'), 0)
+
+    def test_deleting_user_updates_counts(self):
+        """A deleted user's favorites are taken off the counts."""
+        Favorite.toggle(self.uid1, 'Bengal')
+        db.session.commit()
+
+        db.session.delete(self.u1)
+        db.session.commit()
+
+        self.assertEqual(FavoriteCount.count_for('Bengal'), 0)
+        self.assertEqual(FavoriteCount.count_for('Abyssinian'), 0)
+
+    def test_reconcile_reports_and_fixes_drift(self):
+        """reconcile() corrects counts that don't match the favorites table."""
+        FavoriteCount.adjust('Abyssinian', 3)
+        FavoriteCount.adjust('Bengal', 1)
+        db.session.commit()
+
+        drift = FavoriteCount.reconcile()
+        db.session.commit()
+
+        self.assertEqual(drift, {'Abyssinian': (4, 1), 'Bengal': (1, 0)})
+        self.assertEqual(FavoriteCount.count_for('Abyssinian'), 1)
+        self.assertEqual(FavoriteCount.reconcile(), {})
@@ -0,0 +1,82 @@
+"""Password hashing service tests."""
+
+import threading
+import time
+from unittest import TestCase
+
+from hashing import HasherBusy, PasswordHasher, hash_rounds
+
+
+class PasswordHasherTestCase(TestCase):
+    """Test hashing passwords in a process pool."""
+
+    def setUp(self):
+        self.hasher = PasswordHasher(rounds=4, workers=1, max_queue=1)
+
+    def test_hash_and_check(self):
+        """A hash made in the pool checks out against the right password only."""
+        hashed = self.hasher.hash("HASHED_PASSWORD")
+
+        self.assertTrue(hashed.startswith("$2b$04$"))
+        self.assertTrue(self.hasher.check(hashed, "HASHED_PASSWORD"))
+        self.assertFalse(self.hasher.check(hashed, "wrong password"))
+
+    def test_inline(self):
+        """With no workers, hashing runs in the calling process."""
+        hasher = PasswordHasher(rounds=4, workers=0)
+        hashed = hasher.hash("HASHED_PASSWORD")
+
+        self.assertTrue(hasher.check(hashed, "HASHED_PASSWORD"))
+        self.assertIsNone(hasher._pool)
+
+    def test_empty_password(self):
+        """Empty passwords can't be hashed and never match."""
+        with self.assertRaises(ValueError):
+            self.hasher.hash(None)
+
+        self.assertFalse(self.hasher.check(self.hasher.hash("x"), ""))
+        self.assertFalse(self.hasher.check("not a hash", "x"))
+
+    def test_needs_rehash(self):
+        """Hashes with a different work factor need rehashing."""
+        self.assertEqual(hash_rounds("$2b$12$abcdefghijklmnopqrstuv"), 12)
+        self.assertTrue(self.hasher.needs_rehash("$2b$12$abcdefghijklmnopqrstuv"))
+        self.assertFalse(self.hasher.needs_rehash(self.hasher.hash("x")))
+
+    def test_dead_process(self):
+        """If a hashing process dies, the pool is replaced instead of failing every later hash."""
+        self.hasher.hash("HASHED_PASSWORD")
+        for process in list(self.hasher._pool._processes.values()):
+            process.kill()
+            process.join()
+
+        hashed = self.hasher.hash("HASHED_PASSWORD")
+        self.assertTrue(self.hasher.check(hashed, "HASHED_PASSWORD"))
+
+    def test_timeout(self):
+        """A hash that takes longer than the timeout is treated as the hasher being busy."""
+        hasher = PasswordHasher(rounds=14, workers=1, timeout=0.01)
+
+        with self.assertRaises(HasherBusy):
+            hasher.hash("HASHED_PASSWORD")
+
+    def test_queue_limit(self):
+        """Once the pool and queue are full, more work is refused immediately."""
+        self.hasher.rounds = 12
+        started = []
+
+        def hash_slowly():
+            started.append(True)
+            self.hasher.hash("HASHED_PASSWORD")
+
+        threads = [threading.Thread(target=hash_slowly) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        while len(started) < 2 or self.hasher._slots._value:
+            time.sleep(0.001)
+
+        with self.assertRaises(HasherBusy):
+            self.hasher.hash("HASHED_PASSWORD")
+
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,104 @@
+"""Image cache and prefetcher tests."""
+
+from unittest import TestCase
+
+from image_cache import ImageCache, ImagePrefetcher
+
+
+class FakeSearch:
+    """Stands in for the image search endpoint."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, breed_id, limit=5):
+        self.calls.append((breed_id, limit))
+        return [{'id': f'{breed_id}{i}', 'url': f'https://example.com/{breed_id}{i}.jpg'}
+                for i in range(limit)]
+
+
+class ImageCacheTestCase(TestCase):
+    """Test the image cache."""
+
+    def setUp(self):
+        self.search = FakeSearch()
+        self.cache = ImageCache(self.search, ttl=60, max_entries=3)
+
+    def test_miss_then_hit(self):
+        """Images are fetched once per (breed, limit) and then served from the cache."""
+        first = self.cache.get('abys', 5)
+        second = self.cache.get('abys', 5)
+
+        self.assertIs(first, second)
+        self.assertEqual(self.search.calls, [('abys', 5)])
+        self.assertEqual(self.cache.stats()['hit_ratio'], 0.5)
+
+    def test_limit_is_part_of_the_key(self):
+        """A different limit is a different cache entry."""
+        self.cache.get('abys', 5)
+        self.cache.get('abys', 1)
+
+        self.assertEqual(len(self.search.calls), 2)
+
+    def test_expired_entries_are_refetched(self):
+        """Entries past their TTL count as misses."""
+        self.cache.ttl = -1
+        self.cache.get('abys', 5)
+
+        self.assertIsNone(self.cache.lookup('abys', 5))
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+    def test_digest(self):
+        """Each set of cached images has its own digest, and looking it up isn't a hit or miss."""
+        self.assertIsNone(self.cache.digest('abys', 5))
+
+        self.cache.get('abys', 5)
+        digest = self.cache.digest('abys', 5)
+        self.cache.put('abys', 5, [{'id': 'other', 'url': 'https://example.com/other.jpg'}])
+
+        self.assertIsNotNone(digest)
+        self.assertNotEqual(self.cache.digest('abys', 5), digest)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+        self.assertEqual(self.cache.stats()['hits'], 0)
+
+    def test_least_recently_used_is_evicted(self):
+        """Going over max_entries evicts the entry used longest ago."""
+        for breed_id in ('abys', 'beng', 'siam'):
+            self.cache.get(breed_id, 5)
+        self.cache.get('abys', 5)
+        self.cache.get('pers', 5)
+
+        self.assertIsNone(self.cache.lookup('beng', 5))
+        self.assertIsNotNone(self.cache.lookup('abys', 5))
+        self.assertEqual(self.cache.evictions, 1)
+
+    def test_memory_cap(self):
+        """Going over max_bytes evicts entries too."""
+        self.cache.get('abys', 5)
+        self.cache.max_bytes = self.cache.stats()['bytes'] * 3 // 2
+        self.cache.get('beng', 5)
+
+        self.assertEqual(self.cache.stats()['entries'], 1)
+        self.assertLessEqual(self.cache.stats()['bytes'], self.cache.max_bytes)
+
+
+class ImagePrefetcherTestCase(TestCase):
+    """Test the image prefetcher."""
+
+    def setUp(self):
+        self.search = FakeSearch()
+        self.cache = ImageCache(self.search, ttl=60)
+
+    def test_warms_most_viewed_and_most_favorited(self):
+        """The prefetcher loads images for popular breeds that aren't cached."""
+        for _ in range(3):
+            self.cache.record_view('siam')
+        self.cache.record_view('abys')
+        self.cache.get('abys', 5)
+
+        prefetcher = ImagePrefetcher(self.cache, lambda n: ['pers', 'siam'], top_n=2)
+        prefetcher.warm()
+
+        self.assertEqual(sorted(self.search.calls), [('abys', 5), ('pers', 5), ('siam', 5)])
+        self.assertEqual(prefetcher.prefetched, 2)
+        self.assertIsNotNone(self.cache.lookup('pers', 5))
@@ -0,0 +1,70 @@
+"""Metrics endpoint tests."""
+
+import os
+from unittest import TestCase
+
+from models import db, User
+
+os.environ['DATABASE_URL'] = "postgresql:///cat_finder_test"
+os.environ['BREED_SNAPSHOT_PATH'] = ''
+
+from stub_api import shared_stub
+
+os.environ['CAT_API_BASE_URL'] = shared_stub().url
+
+from app import app, image_cache, CURR_USER_KEY
+
+app.config['WTF_CSRF_ENABLED'] = False
+
+
+class MetricsViewTestCase(TestCase):
+    """Test the /metrics endpoint."""
+
+    def setUp(self):
+        db.drop_all()
+        db.create_all()
+
+        user = User.signup(email="test1@test.com", username="testuser1",
+                           password="HASHED_PASSWORD", image_url=None)
+        db.session.commit()
+        self.uid = user.id
+
+        self.client = app.test_client()
+
+    def tearDown(self):
+        db.session.rollback()
+        app.config['METRICS_TOKEN'] = None
+
+    def test_request_and_query_metrics(self):
+        """Requests are timed and their database queries counted per endpoint."""
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.uid
+
+            c.get(f'/users/{self.uid}')
+            resp = c.get('/metrics')
+            text = resp.get_data(as_text=True)
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('text/plain', resp.headers['Content-Type'])
+        self.assertIn('catfinder_request_duration_seconds_count{endpoint="show_user_profile",method="GET",status="200"}', text)
+        self.assertIn('catfinder_db_queries_per_request_count{endpoint="show_user_profile"}', text)
+
+    def test_upstream_metrics(self):
+        """Calls to The Cat API are timed per endpoint and status."""
+        image_cache.clear()
+
+        with self.client as c:
+            c.get('/cats/abys')
+            text = c.get('/metrics').get_data(as_text=True)
+
+        self.assertIn('catfinder_upstream_request_duration_seconds_count{endpoint="images/search",status="200"}', text)
+
+    def test_token(self):
+        """With METRICS_TOKEN set, scrapes must present it."""
+        app.config['METRICS_TOKEN'] = 'sekrit'
+
+        with self.client as c:
+            self.assertEqual(c.get('/metrics').status_code, 401)
+            resp = c.get('/metrics', headers={'Authorization': 'Bearer sekrit'})
+            self.assertEqual(resp.status_code, 200)
@@ -0,0 +1,155 @@
+"""Query budgets for every route, and the query counting helpers behind them."""
+
+import os
+from unittest import TestCase
+
+from sqlalchemy import text
+
+from models import db, User, Favorite
+
+os.environ['DATABASE_URL'] = "postgresql:///cat_finder_test"
+os.environ['BREED_SNAPSHOT_PATH'] = ''
+
+from stub_api import shared_stub
+
+os.environ['CAT_API_BASE_URL'] = shared_stub().url
+
+from app import app, breed_catalog, user_cache, CURR_USER_KEY
+from query_guard import QueryBudgetExceeded, count_queries, query_budget
+
+app.config['WTF_CSRF_ENABLED'] = False
+
+
+class QueryCounterTestCase(TestCase):
+    """Test counting queries."""
+
+    def test_count(self):
+        """Statements made inside the block are recorded."""
+        with app.app_context():
+            with count_queries() as queries:
+                db.session.execute(text("SELECT 1"))
+                db.session.execute(text("SELECT 2"))
+
+        self.assertEqual(queries.count, 2)
+        self.assertEqual(queries.statements, ["SELECT 1", "SELECT 2"])
+
+    def test_budget_exceeded(self):
+        """Going over budget fails, listing what ran."""
+        with app.app_context():
+            with self.assertRaisesRegex(QueryBudgetExceeded, "SELECT 2"):
+                with query_budget(1):
+                    db.session.execute(text("SELECT 1"))
+                    db.session.execute(text("SELECT 2"))
+
+    def test_decorator(self):
+        """Budgets also work as decorators."""
+
+        @query_budget(0)
+        def query():
+            db.session.execute(text("SELECT 1"))
+
+        with app.app_context():
+            with self.assertRaises(QueryBudgetExceeded):
+                query()
+
+    def test_repeated_queries_are_logged(self):
+        """In debug mode, the same statement run three times in one request is logged."""
+        app.debug = True
+
+        try:
+            with app.test_request_context('/'):
+                app.preprocess_request()
+                with self.assertLogs(app.logger, 'WARNING') as logs:
+                    for _ in range(3):
+                        db.session.execute(text("SELECT 1"))
+        finally:
+            app.debug = False
+
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("Possible N+1", logs.output[0])
+
+
+class RouteQueryBudgetTestCase(TestCase):
+    """Every route stays within its query budget, with the user not yet cached."""
+
+    def setUp(self):
+        db.drop_all()
+        db.create_all()
+
+        user = User.signup(email="test1@test.com", username="testuser1",
+                           password="HASHED_PASSWORD", image_url=None)
+        db.session.commit()
+        self.uid = user.id
+
+        db.session.add_all(Favorite(user_id=self.uid, breed_name=name)
+                           for name in ("Abyssinian", "Aegean", "Bengal", "Persian", "Siamese"))
+        db.session.commit()
+
+        breed_catalog.get_breeds()
+        user_cache.clear()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        db.session.rollback()
+
+    def login(self, c):
+        with c.session_transaction() as sess:
+            sess[CURR_USER_KEY] = self.uid
+
+    def assertBudget(self, max_queries, method, path, logged_in=False, **kwargs):
+        with self.client as c:
+            if logged_in:
+                self.login(c)
+            with query_budget(max_queries):
+                resp = c.open(path, method=method, **kwargs)
+            self.assertLess(resp.status_code, 400)
+
+    def test_anonymous_pages(self):
+        """Pages that only show the catalog don't touch the database for anonymous visitors."""
+        self.assertBudget(0, 'GET', '/')
+        self.assertBudget(0, 'GET', '/cats/abys')
+        self.assertBudget(0, 'GET', '/random')
+        self.assertBudget(0, 'GET', '/oops')
+        self.assertBudget(0, 'GET', '/signup')
+        self.assertBudget(0, 'GET', '/login')
+        self.assertBudget(0, 'GET', '/api/breeds?energy_level=5')
+        self.assertBudget(0, 'GET', '/api/breeds/search?q=siam')
+        self.assertBudget(0, 'GET', '/api/breeds/siam/similar')
+        self.assertBudget(0, 'GET', '/metrics')
+        self.assertBudget(0, 'GET', '/static/app.js')
+
+    def test_logged_in_pages(self):
+        """Logged in pages load the user, plus their favorites and recommendations where shown."""
+        self.assertBudget(1, 'GET', '/', logged_in=True)
+        self.assertBudget(2, 'GET', '/cats/abys', logged_in=True)
+        self.assertBudget(3, 'GET', f'/users/{self.uid}', logged_in=True)
+        self.assertBudget(1, 'GET', f'/users/{self.uid}/edit', logged_in=True)
+        self.assertBudget(3, 'GET', f'/api/users/{self.uid}/favorites', logged_in=True)
+
+    def test_popularity_api(self):
+        """Popularity is one read of the stored counts."""
+        self.assertBudget(1, 'GET', '/api/breeds/popular')
+        self.assertBudget(1, 'GET', '/api/breeds/abys/popularity')
+
+    def test_favorites_api(self):
+        """Toggling and batching favorites, and recomputing recommendations, take a fixed number of statements."""
+        self.assertBudget(6, 'POST', '/api/togglefav', logged_in=True, json={'breed_name': 'Bengal'})
+
+        ops = [{'op': 'add', 'breed_name': name} for name in ("Sphynx", "Siberian", "Tonkinese")]
+        ops += [{'op': 'remove', 'breed_name': name} for name in ("Aegean", "Persian")]
+        self.assertBudget(8, 'POST', '/api/favorites/batch', logged_in=True, json={'ops': ops})
+
+    def test_account_routes(self):
+        """Signing up, logging in and out, and editing and deleting an account."""
+        self.assertBudget(2, 'POST', '/signup', data={'username': 'testuser2', 'email': 'test2@test.com',
+                                                      'password': 'HASHED_PASSWORD', 'image_url': ''})
+        self.assertBudget(2, 'POST', '/login', data={'username': 'testuser1', 'password': 'HASHED_PASSWORD'})
+        self.assertBudget(0, 'POST', '/logout', logged_in=True)
+
+        user_cache.clear()
+        self.assertBudget(4, 'POST', f'/users/{self.uid}/edit', logged_in=True,
+                          data={'username': 'testuser1', 'email': 'test1@test.com',
+                                'image_url': '', 'password': 'HASHED_PASSWORD'})
+
+        user_cache.clear()
+        self.assertBudget(5, 'POST', '/users/delete', logged_in=True)
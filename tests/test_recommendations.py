@@ -0,0 +1,99 @@
+"""Recommendation tests."""
+
+import os
+from unittest import TestCase
+
+from models import db, User, Favorite, Recommendation
+
+os.environ['DATABASE_URL'] = "postgresql:///cat_finder_test"
+os.environ['BREED_SNAPSHOT_PATH'] = ''
+
+from app import app
+from catalog import BreedIndex
+from recommendations import TasteModel, recompute_all, recompute_for
+from stub_api import load_breeds
+
+
+class TasteModelTestCase(TestCase):
+    """Test scoring breeds against a user's favorites."""
+
+    def setUp(self):
+        self.breeds = load_breeds()
+        self.model = TasteModel(BreedIndex(self.breeds, version=1))
+
+    def test_recommend(self):
+        """Recommendations leave out favorites and come best first."""
+        favorites = ['Abyssinian', 'Bengal']
+        recommended = self.model.recommend({1: favorites}, n=4)[1]
+        scores = [score for _, score in recommended]
+
+        self.assertEqual(len(recommended), 4)
+        self.assertFalse(set(favorites) & {name for name, _ in recommended})
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_twin_is_recommended_first(self):
+        """A breed with the same traits as a user's only favorite is recommended first."""
+        twin = dict(self.breeds[0], id='twin', name='Twin')
+        model = TasteModel(BreedIndex(self.breeds + [twin], version=1))
+
+        (name, score), = model.recommend({1: [self.breeds[0]['name']]}, n=1)[1]
+        self.assertEqual(name, 'Twin')
+        self.assertAlmostEqual(score, 1.0)
+
+    def test_no_favorites(self):
+        """Users without favorites, or only unknown ones, get no recommendations."""
+        self.assertEqual(self.model.recommend({1: [], 2: ['Not A Breed']}), {1: [], 2: []})
+
+
+class RecomputeTestCase(TestCase):
+    """Test storing recommendations."""
+
+    def setUp(self):
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+
+        self.ctx = app.app_context()
+        self.ctx.push()
+
+        self.uids = []
+        for i in range(5):
+            user = User.signup(email=f"test{i}@test.com", username=f"testuser{i}",
+                               password="HASHED_PASSWORD", image_url=None)
+            db.session.commit()
+            self.uids.append(user.id)
+
+        Favorite.add_many(self.uids[0], ['Abyssinian', 'Bengal'])
+        Favorite.add_many(self.uids[3], ['Persian'])
+        db.session.commit()
+
+        self.model = TasteModel(BreedIndex(load_breeds(), version=1))
+
+    def tearDown(self):
+        db.session.rollback()
+        self.ctx.pop()
+
+    def test_recompute_all(self):
+        """Every user is recomputed, a chunk at a time."""
+        self.assertEqual(recompute_all(self.model, chunk_size=2, n=3), 5)
+
+        self.assertEqual(len(Recommendation.for_user(self.uids[0])), 3)
+        self.assertEqual(len(Recommendation.for_user(self.uids[3])), 3)
+        self.assertEqual(Recommendation.for_user(self.uids[1]), [])
+        self.assertNotIn('Persian', Recommendation.for_user(self.uids[3]))
+
+    def test_recompute_replaces(self):
+        """Recomputing a user replaces their old recommendations, and deleting them removes them."""
+        recompute_for(self.model, [self.uids[0]], n=3)
+        db.session.commit()
+        first = Recommendation.for_user(self.uids[0])
+
+        Favorite.add_many(self.uids[0], first[:1])
+        recompute_for(self.model, [self.uids[0]], n=3)
+        db.session.commit()
+        self.assertNotIn(first[0], Recommendation.for_user(self.uids[0]))
+        self.assertEqual(len(Recommendation.for_user(self.uids[0])), 3)
+
+        db.session.delete(User.query.get(self.uids[0]))
+        db.session.commit()
+        self.assertEqual(Recommendation.query.count(), 0)
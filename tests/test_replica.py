@@ -0,0 +1,109 @@
+"""Read replica routing tests.
+
+These need a second database standing in for the replica, by default
+cat_finder_test_replica. Nothing is replicated to it, so whichever database a
+read went to can be told from what it finds.
+"""
+
+import os
+from unittest import TestCase
+
+from sqlalchemy.exc import OperationalError
+
+from models import db, User, Favorite, REPLICA
+
+os.environ['DATABASE_URL'] = "postgresql:///cat_finder_test"
+os.environ['BREED_SNAPSHOT_PATH'] = ''
+
+from stub_api import shared_stub
+
+os.environ['CAT_API_BASE_URL'] = shared_stub().url
+
+from app import app, user_cache, CURR_USER_KEY, PRIMARY_UNTIL_KEY
+
+app.config['WTF_CSRF_ENABLED'] = False
+
+REPLICA_URL = os.environ.get('TEST_REPLICA_URL', "postgresql:///cat_finder_test_replica")
+
+
+class ReplicaRoutingTestCase(TestCase):
+    """Test sending reads to the replica."""
+
+    def setUp(self):
+        app.config['SQLALCHEMY_BINDS'] = {REPLICA: REPLICA_URL}
+        db.session.remove()
+
+        replica = db.get_engine(app, bind=REPLICA)
+        try:
+            db.metadata.drop_all(bind=replica)
+        except OperationalError:
+            app.config['SQLALCHEMY_BINDS'] = None
+            self.skipTest(f"No replica database at {REPLICA_URL}")
+        db.metadata.create_all(bind=replica)
+
+        db.drop_all()
+        db.create_all()
+
+        user = User.signup(email="test1@test.com", username="testuser1",
+                           password="HASHED_PASSWORD", image_url=None)
+        db.session.commit()
+        self.uid = user.id
+
+        # The replica's copy of the user is behind: renamed, with no favorites.
+        with replica.begin() as conn:
+            conn.execute(User.__table__.insert().values(
+                id=self.uid, email="test1@test.com", username="staleuser1", password=user.password))
+
+        db.session.remove()
+        user_cache.clear()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        db.session.rollback()
+        db.session.remove()
+        app.config['SQLALCHEMY_BINDS'] = None
+        user_cache.clear()
+
+    def test_reads_in_replica_block(self):
+        """Reads inside db.replica() use the replica, others the primary."""
+        with db.replica():
+            self.assertEqual(User.query.get(self.uid).username, "staleuser1")
+
+        db.session.expunge_all()
+        self.assertEqual(User.query.get(self.uid).username, "testuser1")
+
+    def test_reads_after_write_use_primary(self):
+        """Once the session has written, it reads its own writes from the primary."""
+        db.session.add(Favorite(user_id=self.uid, breed_name="Bengal"))
+        db.session.flush()
+        db.session.expunge_all()
+
+        with db.replica():
+            user = User.query.get(self.uid)
+            self.assertEqual(user.username, "testuser1")
+            self.assertEqual([fav.breed_name for fav in user.favorites], ["Bengal"])
+
+    def test_no_replica_configured(self):
+        """Without a replica everything goes to the primary."""
+        app.config['SQLALCHEMY_BINDS'] = None
+
+        with db.replica():
+            self.assertEqual(User.query.get(self.uid).username, "testuser1")
+
+    def test_profile_reads_replica_until_user_writes(self):
+        """The profile page reads the replica, but not for a while after that user writes."""
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.uid
+
+            html = c.get(f'/users/{self.uid}').get_data(as_text=True)
+            self.assertIn("@staleuser1", html)
+
+            c.post('/api/togglefav', json={'breed_name': 'Bengal'})
+            with c.session_transaction() as sess:
+                self.assertIn(PRIMARY_UNTIL_KEY, sess)
+
+            user_cache.clear()
+            html = c.get(f'/users/{self.uid}').get_data(as_text=True)
+            self.assertIn("@testuser1", html)
+            self.assertIn("Bengal", html)
@@ -0,0 +1,69 @@
+"""Similar breeds tests."""
+
+from unittest import TestCase
+
+import numpy as np
+
+from catalog import BreedIndex
+from similarity import TRAITS, SimilarBreeds, top_k, trait_matrix
+from stub_api import load_breeds
+
+
+class SimilarBreedsTestCase(TestCase):
+    """Test precomputing each breed's nearest neighbours."""
+
+    def setUp(self):
+        self.breeds = load_breeds()
+        self.similar = SimilarBreeds(BreedIndex(self.breeds, version=1), k=3)
+
+    def test_trait_matrix(self):
+        """Traits are scaled to 0..1 and missing ones filled with the average."""
+        breeds = [{'energy_level': 1, 'hairless': 1}, {'energy_level': 5}, {'energy_level': 3, 'hairless': 0}]
+        matrix = trait_matrix(breeds)
+
+        self.assertEqual(matrix.shape, (3, len(TRAITS)))
+        self.assertEqual(list(matrix[:, TRAITS.index('energy_level')]), [0, 1, 0.5])
+        self.assertEqual(matrix[1, TRAITS.index('hairless')], 0.5)
+
+    def test_top_k(self):
+        """The k highest scores per row come back highest first."""
+        scores = np.array([[0.1, 0.9, 0.5, 0.7]])
+
+        self.assertEqual(top_k(scores, 2).tolist(), [[1, 3]])
+        self.assertEqual(top_k(scores, 10).tolist(), [[1, 3, 2, 0]])
+
+    def test_neighbours(self):
+        """Every breed has k neighbours, never itself, most similar first."""
+        for metric in ('cosine', 'euclidean'):
+            for breed in self.breeds:
+                similar = self.similar.similar_to(breed['id'], metric)
+                scores = [score for _, score in similar]
+
+                self.assertEqual(len(similar), 3)
+                self.assertNotIn(breed['id'], [other['id'] for other, _ in similar])
+                self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_identical_traits_are_most_similar(self):
+        """A breed with the same traits as another is its nearest neighbour."""
+        twin = dict(self.breeds[0], id='twin', name='Twin')
+        similar = SimilarBreeds(BreedIndex(self.breeds + [twin], version=1), k=1)
+
+        for metric in ('cosine', 'euclidean'):
+            (other, score), = similar.similar_to('twin', metric)
+            self.assertEqual(other['id'], self.breeds[0]['id'])
+            self.assertAlmostEqual(score, 1.0)
+
+    def test_unknown_breed(self):
+        """Unknown breeds, and catalogs too small to compare, have no neighbours."""
+        self.assertEqual(self.similar.similar_to('nope'), ())
+        self.assertEqual(SimilarBreeds(BreedIndex(self.breeds[:1], version=1)).similar_to('abys'), ())
+
+    def test_small_catalog(self):
+        """With no more breeds than k, every other breed is a neighbour, but never the breed itself."""
+        similar = SimilarBreeds(BreedIndex(self.breeds[:3], version=1), k=6)
+
+        for metric in ('cosine', 'euclidean'):
+            neighbours = similar.similar_to(self.breeds[0]['id'], metric)
+            self.assertEqual(len(neighbours), 2)
+            self.assertNotIn(self.breeds[0]['id'], [other['id'] for other, _ in neighbours])
+            self.assertTrue(all(np.isfinite(score) for _, score in neighbours))
@@ -3,9 +3,10 @@
 import os
 from unittest import TestCase
 from sqlalchemy import exc
-from models import db, User
+from models import db, User, hasher
 
 os.environ['DATABASE_URL'] = "postgresql:///cat_finder_test"
+os.environ['BREED_SNAPSHOT_PATH'] = ''
 
 from app import app
 
@@ -104,4 +105,15 @@ class UserModelTestCase(TestCase):
         """The authenticate method fails when the password is invalid."""
         self.assertFalse(User.authenticate("testuser1", "invalidpassword"))
 
+    def test_authenticate_rehashes_to_configured_cost(self):
+        """Logging in upgrades a password hashed with a different work factor."""
+        rounds = hasher.rounds
+        hasher.rounds = 4
+        try:
+            u = User.authenticate("testuser1", "HASHED_PASSWORD")
+            db.session.commit()
+        finally:
+            hasher.rounds = rounds
 
+        self.assertTrue(u.password.startswith("$2b$04$"))
+        self.assertTrue(User.authenticate("testuser1", "HASHED_PASSWORD"))
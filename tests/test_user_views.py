@@ -2,11 +2,17 @@
 
 import os
 from unittest import TestCase
+from sqlalchemy import event
 from models import db, connect_db, User, Favorite
 
 os.environ['DATABASE_URL'] = "postgresql:///cat_finder_test"
+os.environ['BREED_SNAPSHOT_PATH'] = ''
 
-from app import app, CURR_USER_KEY
+from stub_api import shared_stub
+
+os.environ['CAT_API_BASE_URL'] = shared_stub().url
+
+from app import app, user_cache, CURR_USER_KEY
 
 db.create_all()
 
@@ -56,6 +62,7 @@ class UserViewTestCase(TestCase):
 
         self.f1 = f1
 
+        user_cache.clear()
         self.client = app.test_client()
 
     def tearDown(self):
@@ -82,6 +89,39 @@ class UserViewTestCase(TestCase):
             self.assertIn('testuser3', html_profile)
             self.assertIn('https://icon-library.com/images/anonymous-person-icon/anonymous-person-icon-18.jpg', html_profile)
 
+    def record_statements(self):
+        """Collect the SQL statements run until the test ends."""
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        self.addCleanup(event.remove, db.engine, 'before_cursor_execute', before_cursor_execute)
+        return statements
+
+    def test_anonymous_requests_skip_user_query(self):
+        """Pages that don't need a user run no queries for anonymous visitors."""
+        with self.client as c:
+            statements = self.record_statements()
+            resp = c.get('/oops')
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(statements, [])
+
+    def test_current_user_is_cached(self):
+        """The logged in user is loaded from the database once, then from the cache."""
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.uid1
+
+            c.get('/oops')
+            statements = self.record_statements()
+            resp = c.get('/oops')
+
+            self.assertIn('My Profile', resp.get_data(as_text=True))
+            self.assertEqual(statements, [])
+
     def test_add_user_fail(self):
         """Add new user failure."""
         with self.client as c:
@@ -136,6 +176,63 @@ class UserViewTestCase(TestCase):
         self.assertIn("Edit", html)
         self.assertIn("Delete", html)
 
+    def test_show_user_profile_pages(self):
+        """Profiles show a page of favorites at a time with a link to the next."""
+        Favorite.add_many(self.uid1, ['Bengal', 'Persian', 'Siamese'])
+        db.session.commit()
+        app.config['FAVORITES_PER_PAGE'] = 2
+
+        try:
+            with self.client as c:
+                with c.session_transaction() as sess:
+                    sess[CURR_USER_KEY] = self.uid1
+
+                html = c.get(f'/users/{self.uid1}').get_data(as_text=True)
+                self.assertIn("Abyssinian", html)
+                self.assertNotIn("Persian", html)
+                self.assertIn('href="?after=Bengal"', html)
+
+                html = c.get(f'/users/{self.uid1}?after=Bengal').get_data(as_text=True)
+                self.assertIn("Persian", html)
+                self.assertNotIn("Abyssinian", html)
+                self.assertNotIn('?after=', html)
+        finally:
+            app.config['FAVORITES_PER_PAGE'] = 24
+
+    def test_profile_recommendations(self):
+        """Favoriting a breed updates the recommendations shown on the profile."""
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.uid1
+
+            self.assertNotIn("You might also like", c.get(f'/users/{self.uid1}').get_data(as_text=True))
+
+            c.post('/api/togglefav', json={'breed_name': 'Bengal'})
+            html = c.get(f'/users/{self.uid1}').get_data(as_text=True)
+
+            self.assertIn("You might also like", html)
+
+    def test_user_favorites_api(self):
+        """Favorites can be paged through as JSON."""
+        Favorite.add_many(self.uid1, ['Bengal', 'Persian'])
+        db.session.commit()
+
+        with self.client as c:
+            self.assertEqual(c.get(f'/api/users/{self.uid1}/favorites').status_code, 401)
+
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.uid2
+
+            resp = c.get(f'/api/users/{self.uid1}/favorites?limit=2')
+            self.assertEqual([b['name'] for b in resp.json['favorites']], ['Abyssinian', 'Bengal'])
+            self.assertEqual(resp.json['next'], 'Bengal')
+
+            resp = c.get(f'/api/users/{self.uid1}/favorites?limit=2&after=Bengal')
+            self.assertEqual([b['name'] for b in resp.json['favorites']], ['Persian'])
+            self.assertIsNone(resp.json['next'])
+
+            self.assertEqual(c.get('/api/users/999999/favorites').status_code, 404)
+
     def test_edit_user_profile_anon(self):
         """Prevent anonymous users from editing a user's profile."""
         with self.client as c: